@@ -6,3 +6,5 @@ __copyright__ = 'Copyright 2014 Gordon Cassie'
 
 # Version synonym
 VERSION = __version__
+
+default_app_config = 'ember_drf.apps.EmberDRFConfig'
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class EmberDRFConfig(AppConfig):
+    name = 'ember_drf'
+    verbose_name = 'DRF Ember'
+
+    def ready(self):
+        from ember_drf.cache import connect_signals
+        connect_signals()
@@ -0,0 +1,421 @@
+"""
+Caching of serialized sideload records across requests.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple, OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import compat
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """
+    Bounded, thread-safe memo that evicts the least recently used entry
+    once `maxsize` entries are stored.
+
+    Used for plans compiled per serializer class and field names, since
+    sparse fieldsets let clients choose the field names.  `maxsize`
+    defaults to the `EMBER_DRF_PLAN_CACHE_SIZE` setting, or 256.
+    """
+
+    def __init__(self, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'EMBER_DRF_PLAN_CACHE_SIZE', 256)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Get the value of `key`, storing the result of `compute()`."""
+        with self._lock:
+            try:
+                # re-insert to mark the entry as most recently used
+                value = self._cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._cache[key] = value
+                self.hits += 1
+                return value
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        if key not in self._cache:
+            while self.maxsize and len(self._cache) >= self.maxsize:
+                self._cache.popitem(last=False)
+        self._cache[key] = value
+
+    def resize(self, maxsize):
+        """Change the maximum number of entries, evicting if necessary."""
+        with self._lock:
+            self.maxsize = maxsize
+            while maxsize and len(self._cache) > maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._cache))
+
+
+def get_model_label(model):
+    opts = model._meta
+    return '%s.%s' % (opts.app_label, opts.model_name)
+
+
+def get_shared_caches():
+    """
+    Get the `(cache alias, key prefix)` pairs listed in the
+    `EMBER_DRF_SHARED_CACHES` setting, which every process invalidates when
+    a model changes.
+    """
+    return getattr(settings, 'EMBER_DRF_SHARED_CACHES',
+                   [('default', 'ember_drf')])
+
+
+def get_record_key(model, pk, key_prefix='ember_drf'):
+    return '%s:%s:%s' % (key_prefix, get_model_label(model), pk)
+
+
+def invalidate_records(model, pks):
+    """
+    Delete the cached sideload records of `model` with `pks` from the shared
+    caches.
+    """
+    for alias, key_prefix in get_shared_caches():
+        compat.get_cache(alias).delete_many(
+            [get_record_key(model, pk, key_prefix) for pk in pks])
+
+
+def bump_shared_versions(model):
+    """
+    Increment the version counter of `model` in the shared caches.  Counters
+    that do not exist are left alone, no cached response depends on them.
+    """
+    for alias, key_prefix in get_shared_caches():
+        try:
+            compat.get_cache(alias).incr(get_version_key(model, key_prefix))
+        except ValueError:
+            pass
+
+
+# models whose shared cache entries and versions are kept up to date
+_cached_models = set()
+_cached_models_lock = threading.Lock()
+
+
+def invalidate_instance(sender, instance, **kwargs):
+    invalidate_records(sender, [instance.pk])
+    bump_shared_versions(sender)
+
+
+def invalidate_m2m(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if instance.__class__ in _cached_models:
+        invalidate_records(instance.__class__, [instance.pk])
+        bump_shared_versions(instance.__class__)
+    if pk_set and model in _cached_models:
+        invalidate_records(model, pk_set)
+        bump_shared_versions(model)
+
+
+def watch_model(model):
+    """
+    Invalidate the shared cache entries and response versions of `model`
+    whenever an instance is saved or deleted or its many-to-many relations
+    change.
+    """
+    with _cached_models_lock:
+        if model in _cached_models:
+            return
+        _cached_models.add(model)
+    uid = 'ember_drf.cache.%s' % get_model_label(model)
+    post_save.connect(invalidate_instance, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate_instance, sender=model, dispatch_uid=uid)
+    for through in compat.get_m2m_through_models(model):
+        m2m_changed.connect(invalidate_m2m, sender=through, dispatch_uid=uid)
+
+
+def notify_bulk_write(model, pks):
+    """
+    Invalidate the cached records and response versions of `model` after a
+    write that sends no signals, such as `bulk_create()` or
+    `QuerySet.update()`.
+    """
+    invalidate_records(model, pks)
+    bump_shared_versions(model)
+    for sideload_cache in list(_watching_caches):
+        sideload_cache.invalidate(model, pks)
+    for alias, key_prefix in list(_version_trackers.get(model, ())):
+        bump_model_version(model, compat.get_cache(alias), key_prefix)
+
+
+def connect_signals():
+    """
+    Watch the models listed in the `EMBER_DRF_CACHED_MODELS` setting (as
+    `'app_label.ModelName'`).  Called when the `ember_drf` app is ready, so
+    every process invalidates the shared caches, including processes that
+    never use the serializers that cache them.
+    """
+    for label in getattr(settings, 'EMBER_DRF_CACHED_MODELS', ()):
+        watch_model(apps.get_model(label))
+
+
+_watching_caches = set()
+
+
+class SideloadCache(object):
+    """
+    Cache serialized sideload records keyed by model and pk.
+
+    A record rendered by each serializer class for each context key (see
+    `get_context_key()`) is stored under its own key, which includes a
+    generation of the record.  Deleting the generation when an instance is
+    saved or deleted, or its many-to-many relations change, invalidates
+    every variant at once.
+    Changes to other models are not tracked, so use `timeout` for
+    serializers whose output depends on them (e.g. the ids of a reverse
+    relation).
+
+    Caches that are shared between processes must be listed in the
+    `EMBER_DRF_SHARED_CACHES` setting, their models in
+    `EMBER_DRF_CACHED_MODELS`, and `ember_drf` added to `INSTALLED_APPS`,
+    so processes that never use the serializer invalidate them as well.
+
+    Args:
+        cache: a cache alias from `settings.CACHES` or a cache instance.
+            Defaults to a local-memory cache.
+        timeout (int): seconds to keep entries for.
+        key_prefix (str): prefix for every cache key.
+    """
+
+    def __init__(self, cache=None, timeout=300, key_prefix='ember_drf'):
+        self._cache = cache
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._models = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = LocMemCache('ember_drf.sideloads', {})
+        elif not hasattr(self._cache, 'get_many'):
+            self._cache = compat.get_cache(self._cache)
+        return self._cache
+
+    def make_key(self, model, pk):
+        """Get the key of the generation of a record."""
+        return get_record_key(model, pk, self.key_prefix)
+
+    def make_variant_key(self, model, pk, generation, variant):
+        return '%s:%s:%s' % (
+            self.make_key(model, pk), generation,
+            hashlib.md5(variant.encode('utf-8')).hexdigest())
+
+    def get_context_key(self, context):
+        """
+        Get the part of the serializer context that the cached records
+        depend on: the user and the host of the request (for hyperlinks).
+
+        Override to return a constant if the records are the same for every
+        request, or to add other values the serializers read from the
+        context.
+        """
+        request = (context or {}).get('request')
+        if request is None:
+            return ''
+        user_pk = getattr(getattr(request, 'user', None), 'pk', None)
+        return '%s:%s' % (user_pk, request.build_absolute_uri('/'))
+
+    def get_variant(self, serializer_class, context):
+        return '%s.%s:%s' % (serializer_class.__module__,
+                             serializer_class.__name__,
+                             self.get_context_key(context))
+
+    def watch(self, model, serializer_class):
+        """
+        Connect the signals that invalidate the entries of `model` in this
+        process.
+        """
+        watch_model(model)
+        with self._lock:
+            if model in self._models:
+                return
+            self._models.add(model)
+            _watching_caches.add(self)
+            uid = 'ember_drf.sideload_cache.%s.%s' % (
+                id(self), get_model_label(model))
+            post_save.connect(self._invalidate_instance, sender=model,
+                              weak=False, dispatch_uid=uid)
+            post_delete.connect(self._invalidate_instance, sender=model,
+                                weak=False, dispatch_uid=uid)
+            for through in compat.get_m2m_through_models(model):
+                m2m_changed.connect(self._invalidate_m2m, sender=through,
+                                    weak=False, dispatch_uid=uid)
+
+    def get_many(self, model, serializer_class, pks, context=None):
+        """
+        Returns:
+            dict: maps each cached pk to its serialized record.
+        """
+        variant = self.get_variant(serializer_class, context)
+        generations = self.cache.get_many(
+            [self.make_key(model, pk) for pk in pks])
+        keys = {}
+        for pk in pks:
+            generation = generations.get(self.make_key(model, pk))
+            if generation is not None:
+                keys[self.make_variant_key(
+                    model, pk, generation, variant)] = pk
+        ret = dict([(keys[key], record) for key, record in
+                    self.cache.get_many(list(keys)).items()])
+        with self._lock:
+            self.hits += len(ret)
+            self.misses += len(pks) - len(ret)
+        return ret
+
+    def get_generations(self, model, pks):
+        """Get the generation of each record, starting new ones."""
+        keys = dict([(self.make_key(model, pk), pk) for pk in pks])
+        generations = self.cache.get_many(list(keys))
+        ret = {}
+        for key, pk in keys.items():
+            generation = generations.get(key)
+            if generation is None:
+                generation = uuid.uuid4().hex
+                if not self.cache.add(key, generation, self.timeout):
+                    generation = self.cache.get(key)
+            if generation is not None:
+                ret[pk] = generation
+        return ret
+
+    def set_many(self, model, serializer_class, records, context=None):
+        """Store `records`, a dict mapping pks to serialized records."""
+        variant = self.get_variant(serializer_class, context)
+        generations = self.get_generations(model, list(records))
+        self.cache.set_many(dict([
+            (self.make_variant_key(model, pk, generation, variant),
+             records[pk])
+            for pk, generation in generations.items()]), self.timeout)
+
+    def invalidate(self, model, pks):
+        if model in self._models:
+            self.cache.delete_many([self.make_key(model, pk) for pk in pks])
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def _invalidate_instance(self, sender, instance, **kwargs):
+        self.invalidate(sender, [instance.pk])
+
+    def _invalidate_m2m(self, sender, instance, action, model, pk_set,
+                        **kwargs):
+        if not action.startswith('post_'):
+            return
+        self.invalidate(instance.__class__, [instance.pk])
+        if pk_set:
+            self.invalidate(model, pk_set)
+
+
+_tracked_versions = set()
+_tracked_versions_lock = threading.Lock()
+# `(alias, key_prefix)` pairs tracked by `track_model_versions()`, by model
+_version_trackers = defaultdict(set)
+
+
+def _new_version():
+    # time based so a version that was evicted is not reused
+    return int(time.time() * 1000)
+
+
+def get_version_key(model, key_prefix='ember_drf'):
+    return '%s:version:%s' % (key_prefix, get_model_label(model))
+
+
+def get_model_versions(models, cache, key_prefix='ember_drf'):
+    """
+    Get the current version counter of each model in `models`.
+
+    Returns:
+        list: the versions, in the same order as `models`.
+    """
+    keys = [get_version_key(model, key_prefix) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(model, cache, key_prefix='ember_drf'):
+    """Increment the version counter of `model`."""
+    key = get_version_key(model, key_prefix)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def track_model_versions(model, alias='default', key_prefix='ember_drf'):
+    """
+    Bump the version counter of `model` in the cache named `alias` whenever
+    an instance is saved or deleted or its many-to-many relations change.
+
+    The counters of caches in `EMBER_DRF_SHARED_CACHES` are bumped by
+    `watch_model()` instead, in every process that lists `model` in
+    `EMBER_DRF_CACHED_MODELS`.
+    """
+    if (alias, key_prefix) in [tuple(pair) for pair in get_shared_caches()]:
+        watch_model(model)
+        return
+    uid = 'ember_drf.versions.%s.%s.%s' % (
+        alias, key_prefix, get_model_label(model))
+    with _tracked_versions_lock:
+        if uid in _tracked_versions:
+            return
+        _tracked_versions.add(uid)
+        _version_trackers[model].add((alias, key_prefix))
+
+    def bump(sender, **kwargs):
+        bump_model_version(model, compat.get_cache(alias), key_prefix)
+
+    def bump_m2m(sender, instance, action, model=None, **kwargs):
+        if action.startswith('post_') and (
+                isinstance(instance, tracked_model) or model is tracked_model):
+            bump_model_version(
+                tracked_model, compat.get_cache(alias), key_prefix)
+
+    tracked_model = model
+    post_save.connect(bump, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(bump, sender=model, weak=False, dispatch_uid=uid)
+    for through in compat.get_m2m_through_models(model):
+        m2m_changed.connect(bump_m2m, sender=through, weak=False,
+                            dispatch_uid=uid)
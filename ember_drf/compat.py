@@ -27,6 +27,37 @@ def get_related_model(relation_info):
         return relation_info.related
 
 
+def get_related_query_name(model, accessor_name):
+    """
+    DRF exposes reverse relations under their accessor name (e.g.
+    `child_set`), which is not the name used in queries (e.g. `child`) unless
+    `related_name` is set. `Options.get_fields()` was added in Django 1.8.
+    """
+    opts = model._meta
+    try:
+        related_objects = [f for f in opts.get_fields()
+                           if hasattr(f, 'get_accessor_name')]
+    except AttributeError:
+        related_objects = opts.get_all_related_objects() + \
+            opts.get_all_related_many_to_many_objects()
+    for related_object in related_objects:
+        if related_object.get_accessor_name() == accessor_name:
+            return related_object.field.related_query_name()
+    return accessor_name
+
+
+def get_cache(alias):
+    """
+    `django.core.cache.caches` replaced `get_cache()` in Django 1.7.
+    """
+    try:
+        from django.core.cache import caches
+    except ImportError:
+        from django.core.cache import get_cache
+        return get_cache(alias)
+    return caches[alias]
+
+
 def get_exception_handler(exc, context=None):
     """
     `exception_handler` did not accept context as an argument prior to DRF 3.1.
@@ -36,3 +67,78 @@ def get_exception_handler(exc, context=None):
         return exception_handler(exc, context)
     else:
         return exception_handler(exc)
+
+
+def prefetch_related_objects(instances, lookups):
+    """
+    `prefetch_related_objects()` is exposed from `django.db.models` and
+    accepts lookups as positional arguments since Django 1.10.
+    """
+    try:
+        from django.db.models import prefetch_related_objects
+    except ImportError:
+        from django.db.models.query import prefetch_related_objects
+        return prefetch_related_objects(instances, lookups)
+    return prefetch_related_objects(instances, *lookups)
+
+
+def can_return_ids_from_bulk_insert(connection):
+    """
+    `bulk_create()` only sets the pks of the created objects on backends with
+    `can_return_ids_from_bulk_insert` (added in Django 1.10), which was
+    renamed `can_return_rows_from_bulk_insert` in Django 3.0.
+    """
+    features = connection.features
+    return getattr(features, 'can_return_rows_from_bulk_insert', getattr(
+        features, 'can_return_ids_from_bulk_insert', False))
+
+
+def bulk_update(queryset, objs, fields, batch_size=None):
+    """
+    `QuerySet.bulk_update()` was added in Django 2.2.  Fall back to saving
+    each object's `fields`.
+    """
+    if hasattr(queryset, 'bulk_update'):
+        return queryset.bulk_update(objs, fields, batch_size=batch_size)
+    for obj in objs:
+        obj.save(update_fields=fields)
+
+
+def get_generic_foreign_keys(model):
+    """
+    `GenericForeignKey` fields are listed in `Options.virtual_fields`, which
+    was renamed `Options.private_fields` in Django 1.10.
+    """
+    opts = model._meta
+    fields = getattr(opts, 'private_fields', None)
+    if fields is None:
+        fields = opts.virtual_fields
+    return [field for field in fields
+            if hasattr(field, 'ct_field') and hasattr(field, 'fk_field')]
+
+
+def get_related_field(field):
+    """
+    Get the field a foreign key points to.  `Field.rel` was renamed
+    `Field.remote_field` in Django 1.9.
+    """
+    remote_field = getattr(field, 'remote_field', None) or field.rel
+    return remote_field.get_related_field()
+
+
+def get_m2m_through_models(model):
+    """
+    Get the intermediary models of the many-to-many relations of `model`,
+    which send its `m2m_changed` signals.  `Field.rel` was renamed
+    `Field.remote_field` in Django 1.9.
+    """
+    ret = []
+    for field in model._meta.get_fields(include_hidden=True):
+        if not field.many_to_many:
+            continue
+        if field.concrete:
+            field = getattr(field, 'remote_field', None) or field.rel
+        through = getattr(field, 'through', None)
+        if through is not None and through not in ret:
+            ret.append(through)
+    return ret
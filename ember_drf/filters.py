@@ -1,4 +1,9 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.utils import six
+
 from rest_framework import filters
+from rest_framework.exceptions import ValidationError
 
 from . import compat
 
@@ -9,10 +14,79 @@ class CoallesceIDsFilterBackend(filters.BaseFilterBackend):
 
     See http://emberjs.com/blog/2014/08/18/ember-data-1-0-beta-9-released.html
     for more detail.
+
+    Ids are deduplicated and validated against the model's pk field.  At most
+    `max_ids` ids are accepted (override per view with `max_coalesced_ids`).
+    Integer ids beyond `max_query_params` are inlined into the query rather
+    than passed as parameters, so large requests do not exceed database
+    parameter limits (e.g. 999 on SQLite).  Other ids cannot be inlined
+    safely, so at most `max_query_params` of them are accepted.
     """
-    def filter_queryset(self, request, queryset, view):
+    query_param = 'ids[]'
+    max_ids = 5000
+    max_query_params = 500
+
+    def get_max_ids(self, view):
+        return getattr(view, 'max_coalesced_ids', self.max_ids)
+
+    def get_ids(self, request, queryset, view):
+        """
+        Get the deduplicated ids from the request, coerced to the type of
+        the model's pk.
+        """
         query_params = compat.get_request_query_params(request)
-        ids = dict(query_params).get('ids[]')
-        if ids:
-            queryset = queryset.filter(id__in=ids)
-        return queryset
+        return self.clean_ids(query_params.getlist(self.query_param),
+                              queryset.model, view)
+
+    def clean_ids(self, values, model, view, param=None):
+        """
+        Deduplicate `values` and coerce them to the type of `model`'s pk.
+
+        Raises `ValidationError` for invalid ids or more than `max_ids`.
+        """
+        param = param or self.query_param
+        pk_field = model._meta.pk
+        ids = []
+        seen = set()
+        for value in values:
+            try:
+                pk = pk_field.to_python(value)
+            except DjangoValidationError:
+                pk = None
+            if pk is None:
+                raise ValidationError(
+                    {param: ['"%s" is not a valid id.' % value]})
+            if pk not in seen:
+                seen.add(pk)
+                ids.append(pk)
+        max_ids = self.get_max_ids(view)
+        if max_ids is not None and len(ids) > max_ids:
+            raise ValidationError({param: [
+                'No more than %d ids may be requested at once.' % max_ids]})
+        if len(ids) > self.max_query_params and not all(
+                isinstance(pk, six.integer_types) for pk in ids):
+            raise ValidationError({param: [
+                'No more than %d ids may be requested at once.'
+                % self.max_query_params]})
+        return ids
+
+    def filter_ids(self, queryset, ids):
+        """
+        Filter `queryset` to the records with a pk in `ids`, as cleaned by
+        `.clean_ids()`.
+        """
+        if len(ids) <= self.max_query_params:
+            return queryset.filter(pk__in=ids)
+        opts = queryset.model._meta
+        quote_name = connections[queryset.db].ops.quote_name
+        column = '%s.%s' % (quote_name(opts.db_table),
+                            quote_name(opts.pk.column))
+        # safe to inline, every id was coerced to an integer
+        return queryset.extra(where=['%s IN (%s)' % (
+            column, ', '.join([str(int(pk)) for pk in ids]))])
+
+    def filter_queryset(self, request, queryset, view):
+        ids = self.get_ids(request, queryset, view)
+        if not ids:
+            return queryset
+        return self.filter_ids(queryset, ids)
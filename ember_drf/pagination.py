@@ -0,0 +1,34 @@
+from django.utils.six.moves.urllib import parse as urlparse
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class SideloadCursorPagination(CursorPagination):
+    """
+    Keyset pagination for views using a `SideloadSerializer`.
+
+    Only the records of the current page are serialized, so sideloads are
+    collected for that page alone.  Pages are selected by filtering on the
+    `ordering` field rather than with an offset, and no `COUNT(*)` query is
+    made.  The cursors for the next and previous pages are added to the
+    payload under a `meta` key, alongside the root keys.
+    """
+    ordering = 'pk'
+
+    def get_cursor_from_link(self, link):
+        if link is None:
+            return None
+        query = urlparse.parse_qs(urlparse.urlparse(link).query)
+        return query.get(self.cursor_query_param, [None])[0]
+
+    def get_meta(self):
+        return {
+            'next_cursor': self.get_cursor_from_link(self.get_next_link()),
+            'previous_cursor': self.get_cursor_from_link(
+                self.get_previous_link()),
+        }
+
+    def get_paginated_response(self, data):
+        data['meta'] = self.get_meta()
+        return Response(data)
@@ -1,23 +1,82 @@
+import json
+import re
+
+from django.conf import settings
+from django.utils import six
+
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import JSONParser
 
-from ember_drf.utils import (
-    convert_from_ember_json, convert_from_active_model_json
-)
+from ember_drf.utils import remove_id_suffixes_key, underscore_key
+
+_JSON_NESTING_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+
+
+def check_json_depth(string, max_depth):
+    """
+    Raise `ParseError` if arrays/objects in `string` nest deeper than
+    `max_depth`.
+    """
+    depth = 0
+    for match in _JSON_NESTING_TOKENS.finditer(string):
+        token = match.group()
+        if token in '[{':
+            depth += 1
+            if depth > max_depth:
+                raise ParseError(
+                    'JSON parse error - maximum depth of %d exceeded'
+                    % max_depth)
+        elif token in ']}':
+            depth -= 1
+
+
+class KeyConvertingJSONParser(JSONParser):
+    """
+    Parse JSON converting object keys with `.convert_key()` while decoding.
+
+    Each object is built once, already converted.  Set `max_body_size` (in
+    bytes) and/or `max_depth` to reject oversized or deeply nested payloads.
+    """
+    max_body_size = None
+    max_depth = None
+
+    def convert_key(self, key):
+        return key
+
+    def object_pairs_hook(self, pairs):
+        convert_key = self.convert_key
+        return dict([(convert_key(key), value) for key, value in pairs])
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        if self.max_body_size is None:
+            body = stream.read()
+        else:
+            body = stream.read(self.max_body_size + 1)
+            if len(body) > self.max_body_size:
+                raise ParseError(
+                    'JSON parse error - request body exceeds %d bytes'
+                    % self.max_body_size)
+        try:
+            data = body.decode(encoding)
+            if self.max_depth is not None:
+                check_json_depth(data, self.max_depth)
+            return json.loads(data, object_pairs_hook=self.object_pairs_hook)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % six.text_type(exc))
 
 
-class ActiveModelJSONParser(JSONParser):
+class ActiveModelJSONParser(KeyConvertingJSONParser):
     """Parse strings output by Ember Data's ActiveModelSerializer."""
 
-    def parse(self, stream, media_type=None, renderer_context=None):
-        obj = super(ActiveModelJSONParser, self).parse(
-            stream, media_type, renderer_context)
-        return convert_from_active_model_json(obj)
+    def convert_key(self, key):
+        return remove_id_suffixes_key(key)
 
 
-class EmberJSONParser(JSONParser):
+class EmberJSONParser(KeyConvertingJSONParser):
     """Parse strings output by Ember Data's JSONSerializer."""
 
-    def parse(self, stream, media_type=None, renderer_context=None):
-        obj = super(EmberJSONParser, self).parse(
-            stream, media_type, renderer_context)
-        return convert_from_ember_json(obj)
+    def convert_key(self, key):
+        return underscore_key(key)
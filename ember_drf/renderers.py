@@ -1,11 +1,74 @@
+import json
+
+from django.utils import six
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
 from rest_framework.renderers import JSONRenderer
 
 from ember_drf.utils import (
-    convert_to_active_model_json, convert_to_ember_json
+    apply_ember_key_plan, apply_related_field_renames, camelize_root_key,
+    convert_to_active_model_json, convert_to_ember_json, get_ember_key_plan,
+    get_related_field_rename_trie
 )
 
 
-class EmberJSONRenderer(JSONRenderer):
+class StreamingRendererMixin(object):
+    """
+    Adds `.stream()` to render a `SideloadListSerializer` incrementally.
+
+    The result is an iterator of bytes suitable for `StreamingHttpResponse`.
+    Records are fetched, serialized and converted `chunk_size` at a time so
+    memory use does not grow with the size of the response.
+    """
+    stream_buffer_size = 64 * 1024
+
+    def get_stream_converter(self, key, serializer):
+        """
+        Returns a tuple of `(key, convert)` where `convert` is called with
+        each serialized record of the section.
+        """
+        raise NotImplementedError(
+            '`get_stream_converter()` must be implemented.')
+
+    def encode_chunk(self, data):
+        separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        ret = json.dumps(
+            data, cls=self.encoder_class, ensure_ascii=self.ensure_ascii,
+            separators=separators
+        )
+        if isinstance(ret, six.text_type):
+            ret = ret.replace(u'\u2028', u'\\u2028').replace(
+                u'\u2029', u'\\u2029')
+            return bytes(ret.encode('utf-8'))
+        return ret
+
+    def stream(self, serializer, chunk_size=None):
+        """
+        Render `serializer.instance` using `serializer.iter_sections()`.
+        """
+        buf = [b'{']
+        size = 1
+        sections = serializer.iter_sections(serializer.instance, chunk_size)
+        for index, (key, section_serializer, rows) in enumerate(sections):
+            key, convert = self.get_stream_converter(key, section_serializer)
+            buf.append((b',' if index else b'') + self.encode_chunk(key) +
+                       b':[')
+            separator = b''
+            for row in rows:
+                chunk = separator + self.encode_chunk(convert(row))
+                separator = b','
+                buf.append(chunk)
+                size += len(chunk)
+                if size >= self.stream_buffer_size:
+                    yield b''.join(buf)
+                    buf = []
+                    size = 0
+            buf.append(b']')
+        buf.append(b'}')
+        yield b''.join(buf)
+
+
+class EmberJSONRenderer(StreamingRendererMixin, JSONRenderer):
     """Render string compatible with Ember Data's JSONSerializer."""
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
@@ -14,11 +77,20 @@ class EmberJSONRenderer(JSONRenderer):
         return super(EmberJSONRenderer, self).render(
             data, accepted_media_type, renderer_context)
 
+    def get_stream_converter(self, key, serializer):
+        plan = get_ember_key_plan(serializer)
+        return (camelize_root_key(key),
+                lambda row: apply_ember_key_plan(row, plan))
 
-class ActiveModelJSONRenderer(JSONRenderer):
+
+class ActiveModelJSONRenderer(StreamingRendererMixin, JSONRenderer):
     """Render string compatible with Ember Data's ActiveModelSerializer."""
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         data = convert_to_active_model_json(data)
         return super(ActiveModelJSONRenderer, self).render(
             data, accepted_media_type, renderer_context)
+
+    def get_stream_converter(self, key, serializer):
+        trie = get_related_field_rename_trie(serializer)
+        return key, lambda row: apply_related_field_renames(row, trie)
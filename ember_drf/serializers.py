@@ -1,16 +1,28 @@
+import hashlib
+import operator
+import threading
 from collections import defaultdict, namedtuple, OrderedDict
+from itertools import islice
 from inflection import pluralize, underscore
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, router, transaction
+from django.db.models import Max
 from django.db.models.query import QuerySet
+from django.utils import six
 
+from rest_framework.exceptions import ValidationError
 from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.serializers import (
-    ListSerializer, Serializer, LIST_SERIALIZER_KWARGS
+    ListSerializer, ModelSerializer, Serializer, LIST_SERIALIZER_KWARGS
 )
 from rest_framework.utils.model_meta import get_field_info
-from rest_framework.utils.serializer_helpers import ReturnDict
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 
 from . import compat
+from .cache import LRUCache, notify_bulk_write
 
 
 def get_ember_json_key_for_model(model, singular=False):
@@ -22,11 +34,589 @@ def get_ember_json_key_for_model(model, singular=False):
         name = pluralize(name)
     return underscore(name)
 
+
+def iter_chunks(instances, chunk_size):
+    """
+    Iterate over `instances` in lists of at most `chunk_size` items.
+
+    Querysets are iterated without populating their result cache and any
+    `prefetch_related()` lookups are applied to each chunk.
+    """
+    if isinstance(instances, QuerySet):
+        lookups = instances._prefetch_related_lookups
+        iterator = instances.iterator()
+    else:
+        lookups = []
+        iterator = iter(instances)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            compat.prefetch_related_objects(chunk, lookups)
+        yield chunk
+
+
+def get_eager_loading_lookups(serializer, model, prefix='', to_many=False):
+    """
+    Work out the related lookups needed to serialize instances of `model`.
+
+    Args:
+        serializer: a `Serializer` or `ListSerializer` instance.
+        model: the model class being serialized.
+        prefix (str): lookup prefix for nested serializers.
+        to_many (bool): whether `prefix` traverses a to-many relation, in
+            which case every lookup must be prefetched.
+    Returns:
+        tuple: `(select_related lookups, prefetch_related lookups)`
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    relations = get_field_info(model).relations
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        source = field.source.split('.')[0]
+        if source not in relations:
+            continue
+        info = relations[source]
+        lookup = prefix + source
+        if info.to_many or to_many:
+            prefetch.append(lookup)
+        elif isinstance(field, PrimaryKeyRelatedField) and \
+                info.model_field and source == field.source:
+            # DRF reads `<field>_id` for primary key fields
+            continue
+        else:
+            select.append(lookup)
+        if isinstance(field, (ListSerializer, Serializer)):
+            nested_select, nested_prefetch = get_eager_loading_lookups(
+                field, compat.get_related_model(info), lookup + '__',
+                to_many or info.to_many)
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+    return select, prefetch
+
+
+def get_related_models(serializer, model):
+    """
+    Get the models whose rows `serializer` reads through its relation
+    fields when serializing instances of `model`, including the relations
+    of nested serializers.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    relations = get_field_info(model).relations
+    ret = []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        source = field.source.split('.')[0]
+        if source not in relations:
+            continue
+        related_model = compat.get_related_model(relations[source])
+        ret.append(related_model)
+        if isinstance(field, (ListSerializer, Serializer)):
+            ret.extend(get_related_models(field, related_model))
+    return ret
+
+
+def get_only_fields(serializer, model):
+    """
+    Get the names of the model fields read by `serializer`.
+
+    Returns `None` if the serializer reads anything other than model fields
+    and relations (e.g. properties or methods), as deferring columns could
+    then cause a query per instance.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    info = get_field_info(model)
+    names = [info.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        source = field.source.split('.')[0]
+        if source in info.fields or (
+                source in info.forward_relations and
+                not info.forward_relations[source].to_many):
+            names.append(source)
+        elif source == info.pk.name or source == 'pk' or \
+                source in info.relations:
+            continue
+        else:
+            return None
+    return names
+
+
+_eager_loading_plans = LRUCache()
+
+
+def has_many_to_many(model, validated_data):
+    """Check if any of `validated_data` sets a to-many relation."""
+    relations = get_field_info(model).relations
+    return any([name in relations and relations[name].to_many
+                for attrs in validated_data for name in attrs])
+
+
+def overrides_method(serializer_class, name):
+    """
+    Check if `serializer_class` overrides the `ModelSerializer` method
+    `name`, e.g. `create()`.
+    """
+    return six.get_unbound_function(getattr(serializer_class, name)) is not \
+        six.get_unbound_function(getattr(ModelSerializer, name))
+
+
+def can_bulk_write(serializer_class, model, validated_data, method):
+    """
+    Check if records can be written in bulk rather than by the `method`
+    (`create` or `update`) of `serializer_class`.
+    """
+    return not overrides_method(serializer_class, method) and \
+        not has_many_to_many(model, validated_data)
+
+
+def create_records(serializer_class, model, validated_data, context=None,
+                   batch_size=None):
+    """
+    Create records of `model` from a list of validated data.
+
+    Records are inserted with a single `bulk_create()` when the database
+    returns the ids of inserted rows, there are no many-to-many values to
+    set and `serializer_class` does not override `create()`.  Otherwise
+    `serializer_class` creates each record.  Should be called inside a
+    transaction.
+    """
+    db = router.db_for_write(model)
+    if compat.can_return_ids_from_bulk_insert(connections[db]) and \
+            can_bulk_write(serializer_class, model, validated_data, 'create'):
+        created = model._default_manager.db_manager(db).bulk_create(
+            [model(**attrs) for attrs in validated_data],
+            batch_size=batch_size)
+        # `bulk_create()` sends no `post_save`
+        notify_bulk_write(model, [obj.pk for obj in created])
+        return created
+    serializer = serializer_class(context=context)
+    return [serializer.create(attrs) for attrs in validated_data]
+
+
+_reference_fields = {}
+
+
+def get_reference_fields(serializer_class, model):
+    """
+    Get the writable fields of `serializer_class` that reference other
+    records.
+
+    Returns:
+        dict: `field name -> (related model, to_many)`
+    """
+    key = (serializer_class, model)
+    try:
+        return _reference_fields[key]
+    except KeyError:
+        pass
+    relations = get_field_info(model).forward_relations
+    ret = {}
+    for name, field in serializer_class().fields.items():
+        if field.read_only or field.source not in relations:
+            continue
+        info = relations[field.source]
+        ret[name] = (compat.get_related_model(info), info.to_many)
+    _reference_fields[key] = ret
+    return ret
+
+
+def get_max_values(model, pks, fields):
+    """
+    Get the maximum of each of `fields` that exists on `model` over the
+    records in `pks`, with a single aggregate query.
+    """
+    names = [name for name in fields if name in get_field_info(model).fields]
+    if not names or not pks:
+        return []
+    values = model._default_manager.filter(pk__in=pks).aggregate(
+        **dict([(name, Max(name)) for name in names]))
+    return [values[name] for name in names]
+
+
+def trim_fields(serializer, names, param='fields'):
+    """
+    Remove the fields of `serializer` that are not in `names`.
+
+    The primary key field is always kept.  Raises `ValidationError` if
+    `names` contains a field that `serializer` does not have.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    fields = serializer.fields
+    unknown = sorted(set(names) - set(fields))
+    if unknown:
+        raise ValidationError(
+            {param: ['Unknown fields: %s.' % ', '.join(unknown)]})
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    pk_names = ['pk'] + ([model._meta.pk.name] if model else [])
+    for name, field in list(fields.items()):
+        if name not in names and field.source not in pk_names:
+            del fields[name]
+    return serializer
+
+
+def defer_unused_fields(queryset, serializer, keep=()):
+    """
+    Apply `only()` to `queryset` with the fields read by `serializer` and
+    `keep`, if they can be worked out.
+    """
+    only = get_only_fields(serializer, queryset.model)
+    if only is not None and queryset.query.select_related is False:
+        queryset = queryset.only(*(only + list(keep)))
+    return queryset
+
+
+def optimize_queryset(queryset, serializer, keep=()):
+    """
+    Apply the `select_related()`, `prefetch_related()` and `only()` calls
+    needed to serialize `queryset` with `serializer` in a fixed number of
+    queries.  Plans are cached per serializer class and field names.
+
+    `keep` names fields that must not be deferred by `only()`.
+    """
+    model = queryset.model
+    child = serializer.child if isinstance(serializer, ListSerializer) \
+        else serializer
+    def compile_plan():
+        select, prefetch = get_eager_loading_lookups(child, model)
+        return select, prefetch, get_only_fields(child, model)
+
+    select, prefetch, only = _eager_loading_plans.get(
+        (child.__class__, tuple(child.fields), model), compile_plan)
+    # avoid conflicts with related lookups added by the caller
+    if only is not None and queryset.query.select_related is False:
+        queryset = queryset.only(*(only + list(keep)))
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class IdentityMap(object):
+    """
+    Serialized records keyed by serializer class, model and pk.
+
+    A single map is shared through the serializer context so that, within a
+    request, each record is fetched and serialized at most once per
+    serializer class.
+    """
+
+    def __init__(self):
+        self._records = {}
+
+    def get(self, serializer_class, model, pk):
+        return self._records.get((serializer_class, model, pk))
+
+    def add(self, serializer_class, model, pk, data):
+        self._records[(serializer_class, model, pk)] = data
+
+    def add_many(self, serializer_class, instances, rows):
+        """Register serialized `rows` for the matching `instances`."""
+        for instance, row in zip(instances, rows):
+            self.add(serializer_class, instance.__class__, instance.pk, row)
+
+    def split(self, serializer_class, model, pks):
+        """
+        Returns:
+            tuple: `(records, missing)` where `records` is a dictionary of
+                the serialized records already in the map by pk and
+                `missing` is a list of the pks that are not.
+        """
+        records, missing = {}, []
+        for pk in pks:
+            record = self._records.get((serializer_class, model, pk))
+            if record is None:
+                missing.append(pk)
+            else:
+                records[pk] = record
+        return records, missing
+
+    def clear(self):
+        self._records.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+
+def get_identity_map(context):
+    """
+    Get the `IdentityMap` for a serializer context, creating it if needed.
+
+    The map is stored on `context['request']` when available so that every
+    serializer used for the request shares it, or in `context` otherwise.
+    """
+    request = context.get('request')
+    if request is None:
+        try:
+            return context['identity_map']
+        except KeyError:
+            identity_map = context['identity_map'] = IdentityMap()
+            return identity_map
+    identity_map = getattr(request, 'ember_identity_map', None)
+    if identity_map is None:
+        identity_map = request.ember_identity_map = IdentityMap()
+    return identity_map
+
+
+def clear_identity_map(context):
+    """
+    Forget the records serialized so far in the request of `context`, after
+    a write may have changed them.
+    """
+    get_identity_map(context).clear()
+
+
+class IdentityMapMixin(object):
+    """
+    Serializer mixin that reuses records already serialized by the same
+    serializer class in the current request, e.g. when a nested serializer
+    renders the same instance for many rows.
+    """
+
+    def save(self, **kwargs):
+        clear_identity_map(self.context)
+        return super(IdentityMapMixin, self).save(**kwargs)
+
+    def to_representation(self, instance):
+        identity_map = get_identity_map(self.context)
+        ret = identity_map.get(self.__class__, instance.__class__, instance.pk)
+        if ret is None:
+            ret = super(IdentityMapMixin, self).to_representation(instance)
+            identity_map.add(
+                self.__class__, instance.__class__, instance.pk, ret)
+        return ret
+
+
 Sideload = namedtuple('Sideload', ['field', 'model', 'serializer', 'queryset',
-                                   'key_name'])
+                                   'key_name', 'attname', 'query_name',
+                                   'cache', 'generic_relation'])
+
+SideloadConfiguration = namedtuple('SideloadConfiguration', [
+    'model', 'default_base_key', 'eager_load', 'sideloads',
+    'sideloads_by_key', 'sideload_depth', 'transitive_sideloads',
+    'writable_sideloads'])
+
+_sideload_configurations = {}
+_sideload_configurations_lock = threading.Lock()
+
+
+def get_sideload_configuration(serializer_class):
+    """
+    Get the `SideloadConfiguration` of a `SideloadSerializer` class.
+
+    The configuration is assembled from `Meta` when first needed and shared
+    by every instance of the class.
+    """
+    try:
+        return _sideload_configurations[serializer_class]
+    except KeyError:
+        pass
+    with _sideload_configurations_lock:
+        if serializer_class not in _sideload_configurations:
+            _sideload_configurations[serializer_class] = \
+                build_sideload_configuration(serializer_class.Meta)
+        return _sideload_configurations[serializer_class]
+
+
+def get_relation_sideloads(model, serializer_class, configs, caches):
+    """
+    Get a `Sideload` for each relation of `model` rendered by
+    `serializer_class` whose related model is in `configs`.
+
+    Args:
+        configs (dict): `model -> (model, serializer class, queryset)`
+        caches (dict): `model -> SideloadCache`
+    """
+    sideloads = []
+    relations = get_field_info(model).relations
+    fields = {}
+    for field in serializer_class().fields.values():
+        fields.setdefault(field.source, field)
+    for field_name, relation_info in relations.items():
+        conf = configs.get(compat.get_related_model(relation_info))
+        if conf is None or field_name not in fields:
+            continue
+        key_name = getattr(conf[1].Meta, 'base_key',
+                           underscore(conf[0].__name__))
+        # forward foreign keys store the related id on the instance,
+        # other relations are looked up with a query on `model`
+        attname = query_name = None
+        model_field = relation_info.model_field
+        if relation_info.to_many or not model_field:
+            query_name = compat.get_related_query_name(model, field_name)
+        elif compat.get_related_field(model_field).primary_key:
+            attname = model_field.attname
+        else:
+            # a `to_field` foreign key does not store the related pk
+            query_name = '%s__pk' % field_name
+        cache = caches.get(conf[0])
+        if cache is not None:
+            cache.watch(conf[0], conf[1])
+        sideloads.append(Sideload(
+            field=fields[field_name], model=conf[0], serializer=conf[1],
+            queryset=conf[2], key_name=pluralize(key_name),
+            attname=attname, query_name=query_name, cache=cache,
+            generic_relation=None
+        ))
+    # a generic foreign key can point to any of the sideloaded models, each
+    # is sideloaded under its own key
+    for relation in compat.get_generic_foreign_keys(model):
+        field = fields.get(relation.name, fields.get(relation.fk_field))
+        if field is None:
+            continue
+        for conf in configs.values():
+            key_name = getattr(conf[1].Meta, 'base_key',
+                               underscore(conf[0].__name__))
+            cache = caches.get(conf[0])
+            if cache is not None:
+                cache.watch(conf[0], conf[1])
+            sideloads.append(Sideload(
+                field=field, model=conf[0], serializer=conf[1],
+                queryset=conf[2], key_name=pluralize(key_name),
+                attname=relation.fk_field, query_name=None, cache=cache,
+                generic_relation=relation
+            ))
+    return tuple(sideloads)
+
+
+def get_content_type_column(sideload):
+    """
+    Get the content type column of a generic relation sideload and the id it
+    holds for records of `sideload.model`, as `(attname, id)`.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    relation = sideload.generic_relation
+    attname = relation.model._meta.get_field(relation.ct_field).attname
+    content_type = ContentType.objects.get_for_model(
+        sideload.model, for_concrete_model=relation.for_concrete_model)
+    return attname, content_type.pk
+
+
+def get_sideload_columns(sideload):
+    """
+    Get the columns holding the ids to sideload for a foreign key sideload.
+    """
+    if sideload.generic_relation is None:
+        return [sideload.attname]
+    return [sideload.attname, get_content_type_column(sideload)[0]]
+
+
+def get_related_ids(sideload, items, getter=getattr):
+    """
+    Read the ids to sideload for a foreign key sideload from `items`, which
+    are instances, or rows from `values()` when `getter` is
+    `operator.getitem`.
+
+    Generic relations only yield the ids of records of `sideload.model`.
+    """
+    if sideload.generic_relation is None:
+        return [getter(item, sideload.attname) for item in items]
+    attname, content_type_id = get_content_type_column(sideload)
+    to_python = sideload.model._meta.pk.to_python
+    return [to_python(getter(item, sideload.attname)) for item in items
+            if getter(item, attname) == content_type_id]
+
+
+def get_source_fields(sideload):
+    """
+    Get the names of the model fields to keep loaded for a foreign key
+    sideload.
+    """
+    relation = sideload.generic_relation
+    if relation is None:
+        return [sideload.field.source]
+    return [relation.fk_field, relation.ct_field]
+
+
+def build_sideload_configuration(meta):
+    """
+    Assemble configuration for each sideload.
+    """
+    base_serializer = meta.base_serializer
+    model = base_serializer.Meta.model
+    caches = getattr(meta, 'sideload_caches', {})
+    configs = OrderedDict()
+    for conf in getattr(meta, 'sideloads', []):
+        assert isinstance(conf, tuple) and len(conf) >= 2 \
+            and len(conf) <= 3, (
+            '`Meta.sideloads` must be a list of tuples in the following '
+            'format: (<model class>, <serializer class>, '
+            '<queryset instance (optional)>)'
+        )
+        queryset = conf[0].objects.all() if (len(conf) == 2) else conf[2]
+        configs.setdefault(conf[0], (conf[0], conf[1], queryset))
+
+    sideloads = get_relation_sideloads(model, base_serializer, configs, caches)
+    # relations of the sideloaded models, for `Meta.sideload_depth`
+    sideload_depth = getattr(meta, 'sideload_depth', 1)
+    transitive_sideloads = {}
+    if sideload_depth > 1:
+        for related_model, serializer, queryset in configs.values():
+            transitive_sideloads[related_model] = get_relation_sideloads(
+                related_model, serializer, configs, caches)
+    sideloads_by_key = {}
+    for sideload in sideloads + sum(transitive_sideloads.values(), ()):
+        sideloads_by_key.setdefault(sideload.key_name, sideload)
+
+    return SideloadConfiguration(
+        model=model,
+        default_base_key=get_ember_json_key_for_model(model, True),
+        eager_load=getattr(meta, 'eager_load', False),
+        sideloads=sideloads,
+        sideloads_by_key=sideloads_by_key,
+        sideload_depth=sideload_depth,
+        transitive_sideloads=transitive_sideloads,
+        writable_sideloads=getattr(meta, 'writable_sideloads', False),
+    )
+
+
+def split_names(value):
+    """
+    Split a comma separated query parameter into a set of underscored names.
+    """
+    return set([underscore(name.strip()) for name in value.split(',')
+                if name.strip()])
+
+
+def select_sideload_keys(query_params, key_names, include_param='include',
+                         exclude_param='exclude'):
+    """
+    Select the sideload keys in `key_names` named by the `include` and
+    `exclude` query parameters.
+
+    Names may be camelized, e.g. `include=parentModels`.  Raises
+    `ValidationError` for names that are not in `key_names`.
+    """
+    selected = set(key_names)
+    for param in (include_param, exclude_param):
+        value = query_params.get(param)
+        if value is None:
+            continue
+        names = split_names(value)
+        unknown = sorted(names - set(key_names))
+        if unknown:
+            raise ValidationError(
+                {param: ['Unknown sideloads: %s.' % ', '.join(unknown)]})
+        if param == include_param:
+            selected = selected & names
+        else:
+            selected = selected - names
+    return selected
 
 
 class SideloadSerializerMixin(object):
+    include_query_param = 'include'
+    exclude_query_param = 'exclude'
 
     def get_sideload_config(self):
         """
@@ -64,66 +654,369 @@ class SideloadSerializerMixin(object):
             dict: Dictionary where each key represents a model type and each
                 value is a list of instances of that model type.
         """
-        sideload_ids = self.get_sideload_ids(data)
+        primary_pks = self.get_primary_pks(data)
+        sideload_ids = self.exclude_loaded_ids(
+            self.get_sideload_ids(data), primary_pks)
+        loaded = defaultdict(set)
+        loaded[self.model].update(primary_pks)
+        ret = {}
+        for depth in range(self.sideload_depth):
+            instances = {}
+            for key, ids in sideload_ids.items():
+                conf = self.sideloads_by_key[key]
+                loaded[conf.model].update(ids)
+                rows, instances[key] = self.load_sideload(key, conf, ids)
+                if key in ret:
+                    rows = ReturnList(list(ret[key]) + list(rows),
+                                      serializer=rows.serializer)
+                ret[key] = rows
+            if depth + 1 == self.sideload_depth:
+                break
+            sideload_ids = self.remove_loaded_ids(
+                self.collect_transitive_ids(sideload_ids, instances), loaded)
+            sideload_ids = dict([(key, ids) for key, ids in
+                                 sideload_ids.items() if ids])
+            if not sideload_ids:
+                break
+        return ret
+
+    def load_sideload(self, key, conf, ids):
+        """
+        Serialize the records of a sideload.
+
+        Returns:
+            tuple: `(data, instances)` where `instances` are the records
+                fetched from the database.  Other records come from the
+                identity map or the sideload cache, and are merged with the
+                fetched ones in pk order.
+        """
+        identity_map = get_identity_map(self.context)
+        # trimmed records must not be shared with other serializers
+        sparse = self.get_sparse_fields(key) is not None
+        ids = sorted(ids)
+        order = ids
+        if sparse:
+            records = {}
+        else:
+            records, ids = identity_map.split(
+                conf.serializer, conf.model, ids)
+        if ids and conf.cache is not None and not sparse:
+            cached = conf.cache.get_many(
+                conf.model, conf.serializer, ids, self.context)
+            for pk, record in cached.items():
+                identity_map.add(conf.serializer, conf.model, pk, record)
+            records.update(cached)
+            ids = [pk for pk in ids if pk not in cached]
+        serializer = self.get_records_serializer(conf.serializer, key)
+        instances = []
+        if ids:
+            queryset = self.optimize_queryset(
+                conf.queryset.filter(pk__in=ids), serializer, sparse)
+            serializer.instance = queryset
+            data = serializer.data
+            instances = list(queryset)
+            if sparse:
+                return data, instances
+            identity_map.add_many(conf.serializer, instances, data)
+            if conf.cache is not None:
+                conf.cache.set_many(conf.model, conf.serializer, dict(
+                    [(obj.pk, row) for obj, row in zip(instances, data)]),
+                    self.context)
+        else:
+            serializer.instance = []
+            data = serializer.data
+        if records:
+            records.update(zip([obj.pk for obj in instances], data))
+            data = ReturnList([records[pk] for pk in order if pk in records],
+                              serializer=serializer)
+        return data, instances
+
+    def collect_transitive_ids(self, sideload_ids, instances):
+        """
+        Collect the ids to sideload for the relations of sideloaded records.
+
+        Foreign key ids are read from `instances` where the records were
+        fetched, and with one `values_list()` query per model otherwise.
+        Other relations take one query per relation.
+
+        Args:
+            sideload_ids (dict): the ids sideloaded at the previous level.
+            instances (dict): the instances fetched at the previous level.
+        """
+        included = self.get_included_keys()
         ret = defaultdict(set)
         for key, ids in sideload_ids.items():
-            conf = self.sideloads[
-                [t.key_name for t in self.sideloads].index(key)]
-            queryset = conf.queryset.filter(id__in=ids)
-            serializer = conf.serializer(
-                queryset,
-                many=True,
-                context=self.context
-            )
-            ret[key] = serializer.data
+            model = self.sideloads_by_key[key].model
+            sideloads = [conf for conf in self.transitive_sideloads[model]
+                         if conf.key_name in included]
+            fetched = instances.get(key, [])
+            fetched_pks = set([obj.pk for obj in fetched])
+            other_pks = [pk for pk in ids if pk not in fetched_pks]
+            fk_confs = [conf for conf in sideloads if conf.attname]
+            for conf in fk_confs:
+                ret[conf.key_name].update(get_related_ids(conf, fetched))
+            if fk_confs and other_pks:
+                columns = set()
+                for conf in fk_confs:
+                    columns.update(get_sideload_columns(conf))
+                rows = list(model._default_manager.filter(pk__in=other_pks)
+                            .values(*sorted(columns)))
+                for conf in fk_confs:
+                    ret[conf.key_name].update(
+                        get_related_ids(conf, rows, operator.getitem))
+            for conf in sideloads:
+                if conf.attname is None and ids:
+                    ret[conf.key_name].update(
+                        model._default_manager.filter(pk__in=ids)
+                        .values_list(conf.query_name, flat=True))
+        for ids in ret.values():
+            ids.discard(None)
         return ret
 
-    def _configure_sideloads(self, meta):
-        """
-        Assemble configuration for each sideload.
-        """
-        self.sideloads = []
-        configs = []
-        for conf in getattr(meta, 'sideloads', []):
-            assert isinstance(conf, tuple) and len(conf) >= 2 \
-                and len(conf) <= 3, (
-                '`Meta.sideloads` must be a list of tuples in the following '
-                'format: (<model class>, <serializer class>, '
-                '<queryset instance (optional)>)'
-            )
-            model, serializer = conf[:2]
-            queryset = conf[0].objects.all() if (len(conf) == 2) else conf[2]
-            configs.append((model, serializer, queryset))
-
-        relations = get_field_info(self.model).relations
-        fields = self.base_serializer.fields.values()
-        for field_name, relation_info in relations.items():
-            try:
-                related_model = compat.get_related_model(relation_info)
-                conf = configs[
-                    [t[0] for t in configs].index(related_model)
-                ]
-            except ValueError:
+    def get_included_sideloads(self):
+        """
+        Get the sideloads selected with the `include` and `exclude` query
+        parameters, e.g. `include=parent_models,child_models`.
+
+        Every sideload is included by default.  Raises `ValidationError` for
+        names that are not sideload keys of this serializer.
+        """
+        selected = self.get_included_keys()
+        return [conf for conf in self.sideloads if conf.key_name in selected]
+
+    def get_included_keys(self):
+        """
+        Get the set of sideload keys selected with the `include` and
+        `exclude` query parameters.
+
+        A view that already selected the keys across several serializers
+        passes them as `context['included_sideloads']`.
+        """
+        key_names = set(self.sideloads_by_key)
+        if 'included_sideloads' in self.context:
+            return key_names & self.context['included_sideloads']
+        request = self.context.get('request')
+        if request is None:
+            return key_names
+        return select_sideload_keys(
+            compat.get_request_query_params(request), key_names,
+            self.include_query_param, self.exclude_query_param)
+
+    def get_sparse_fields(self, key):
+        """
+        Get the field names requested for the records under `key` with the
+        `fields[<key>]` query parameter, e.g. `fields[child_models]=parent`.
+        The key and the names may be camelized, e.g.
+        `fields[childModels]=oldParent`.
+
+        Returns `None` if no fields were requested.
+        """
+        request = self.context.get('request')
+        if request is None:
+            return None
+        for param, value in compat.get_request_query_params(request).items():
+            if (param.startswith('fields[') and param.endswith(']') and
+                    underscore(param[7:-1]) == key):
+                return sorted(split_names(value))
+        return None
+
+    def get_records_serializer(self, serializer_class, key):
+        """
+        Instantiate `serializer_class` to serialize the records under `key`,
+        trimmed to the requested sparse fields.
+        """
+        serializer = serializer_class(many=True, context=self.context)
+        names = self.get_sparse_fields(key)
+        if names is not None:
+            trim_fields(serializer, names, 'fields[%s]' % key)
+        return serializer
+
+    def get_primary_pks(self, data):
+        """Get the pks of the primary records being serialized."""
+        if isinstance(data, (list, tuple, QuerySet)):
+            return [item.pk for item in data]
+        return [data.pk]
+
+    def exclude_loaded_ids(self, sideload_ids, primary_pks):
+        """
+        Remove ids of records that are already part of the response.
+
+        Records of the base model in the primary data are not sideloaded
+        again, and a record of a model that appears under several sideload
+        keys is only included once.
+        """
+        loaded = defaultdict(set)
+        loaded[self.model].update(primary_pks)
+        return self.remove_loaded_ids(sideload_ids, loaded)
+
+    def remove_loaded_ids(self, sideload_ids, loaded):
+        """
+        Remove the ids in `loaded` (a dictionary of pks by model) from
+        `sideload_ids`, adding the remaining ids to `loaded`.
+        """
+        for key in sorted(sideload_ids):
+            model = self.sideloads_by_key[key].model
+            sideload_ids[key] -= loaded[model]
+            loaded[model].update(sideload_ids[key])
+        return sideload_ids
+
+    def get_sideload_key(self, key):
+        """
+        Get the key to nest sideloads under in the response.
+
+        Sideloads that share the primary records' key are prefixed with an
+        underscore, which Ember Data reads as sideloaded records of the
+        primary type.
+        """
+        if key == self.get_primary_key():
+            return '_' + key
+        return key
+
+    def collect_sideload_ids(self, instances):
+        """
+        Gets a dictionary of the ids to sideload for a list of instances.
+
+        Foreign key ids are read from the instances.  Ids for all other
+        relations are fetched with one `values_list()` query per relation
+        over the pks of `instances`.
+        """
+        sideload_ids = defaultdict(set)
+        pks = None
+        for config in self.get_included_sideloads():
+            ids = sideload_ids[config.key_name]
+            if config.attname is not None:
+                ids.update(get_related_ids(config, instances))
                 continue
-            field = fields[[f.source for f in fields].index(field_name)]
-            key_name = getattr(conf[1].Meta, 'base_key',
-                               underscore(conf[0].__name__))
-            self.sideloads.append(Sideload(
-                field=field, model=conf[0], serializer=conf[1],
-                queryset=conf[2], key_name=pluralize(key_name)
-            ))
+            if pks is None:
+                pks = [i.pk for i in instances]
+            if pks:
+                ids.update(
+                    self.model._default_manager.filter(pk__in=pks)
+                    .values_list(config.query_name, flat=True))
+        for ids in sideload_ids.values():
+            ids.discard(None)
+        return sideload_ids
+
+    def get_fingerprint(self, queryset, fields=()):
+        """
+        Compute a fingerprint of the response for `queryset` without
+        serializing it.
+
+        Args:
+            queryset (QuerySet): the primary records, or a list of the
+                instances when they were already fetched (e.g. a page).
+            fields (tuple): names of columns such as `updated_at` whose
+                maximum is included for each model that has them.
+        Returns:
+            str: a hex digest that changes when the set of primary or
+                sideloaded records, or the maximum of `fields`, changes.
+        """
+        sideloads = self.get_included_sideloads()
+        fk_confs = [conf for conf in sideloads if conf.attname is not None]
+        columns = set()
+        for conf in fk_confs:
+            columns.update(get_sideload_columns(conf))
+        if isinstance(queryset, QuerySet):
+            rows = list(queryset.values('pk', *sorted(columns)))
+            getter = operator.getitem
+        else:
+            rows, getter = list(queryset), getattr
+        pks = [getter(row, 'pk') for row in rows]
+        sideload_ids = defaultdict(set)
+        for conf in fk_confs:
+            sideload_ids[conf.key_name].update(
+                get_related_ids(conf, rows, getter))
+        for conf in sideloads:
+            if conf.attname is None and pks:
+                sideload_ids[conf.key_name].update(
+                    self.model._default_manager.filter(pk__in=pks)
+                    .values_list(conf.query_name, flat=True))
+        for ids in sideload_ids.values():
+            ids.discard(None)
+        level_ids = dict(sideload_ids)
+        loaded = defaultdict(set)
+        for depth in range(1, self.sideload_depth):
+            level_ids = self.remove_loaded_ids(
+                self.collect_transitive_ids(level_ids, {}), loaded)
+            for key, ids in level_ids.items():
+                sideload_ids[key].update(ids)
+        parts = [(self.get_primary_key(), sorted(pks),
+                  get_max_values(self.model, pks, fields))]
+        for key in sorted(sideload_ids):
+            ids = sorted(sideload_ids[key])
+            parts.append((key, ids, get_max_values(
+                self.sideloads_by_key[key].model, ids, fields)))
+        return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+    def optimize_queryset(self, queryset, serializer=None, sparse=False):
+        """
+        Apply eager loading for `serializer` (the base serializer by default)
+        to `queryset` if `Meta.eager_load` is set, or defer the columns it
+        does not read if `sparse` is set.
+        """
+        if not isinstance(queryset, QuerySet) or \
+                queryset._result_cache is not None:
+            return queryset
+        if serializer is None:
+            serializer = self.base_serializer
+        # sideload ids are read from the foreign keys of the primary records
+        sideloads = list(self.transitive_sideloads.get(queryset.model, ()))
+        if queryset.model is self.model:
+            sideloads.extend(self.sideloads)
+        keep = []
+        for conf in sideloads:
+            if conf.attname is not None:
+                keep.extend(get_source_fields(conf))
+        if self.eager_load:
+            return optimize_queryset(queryset, serializer, keep)
+        if sparse:
+            return defer_unused_fields(queryset, serializer, keep)
+        return queryset
+
+    def _configure_sideloads(self, serializer_class):
+        """
+        Set up the sideload configuration of `serializer_class`.
+        """
+        config = get_sideload_configuration(serializer_class)
+        self.model = config.model
+        # read on each instantiation, so it can be changed at runtime
+        self.base_key = getattr(serializer_class.Meta.base_serializer.Meta,
+                                'base_key', config.default_base_key)
+        self.eager_load = config.eager_load
+        self.sideloads = config.sideloads
+        self.sideloads_by_key = config.sideloads_by_key
+        self.sideload_depth = config.sideload_depth
+        self.transitive_sideloads = config.transitive_sideloads
+        self.writable_sideloads = config.writable_sideloads
 
 
 class SideloadListSerializer(SideloadSerializerMixin, ListSerializer):
+    stream_chunk_size = 500
+    bulk_batch_size = 500
 
-    def __init__(self, *args, **kwargs):
-        super(SideloadListSerializer, self).__init__(*args, **kwargs)
-        meta = self.child.Meta
-        self.base_serializer = meta.base_serializer()
-        self.model = self.base_serializer.Meta.model
-        self.base_key = getattr(self.base_serializer.Meta, 'base_key',
-                                get_ember_json_key_for_model(self.model, True))
-        self._configure_sideloads(meta)
+    def __init__(self, instance=None, data=empty, **kwargs):
+        child = kwargs['child']
+        self.base_serializer_class = child.Meta.base_serializer
+        self._configure_sideloads(child.__class__)
+        if data is not empty:
+            key = self.get_primary_key()
+            if not isinstance(data, dict):
+                raise AssertionError('`data` must be a `dict`.')
+            if key not in data:
+                raise AssertionError(
+                    'You must nest the attributes for the new objects '
+                    'under a root key: %s' % key)
+            data = data[key]
+        super(SideloadListSerializer, self).__init__(instance, data, **kwargs)
+
+    @property
+    def base_serializer(self):
+        """An instance of `Meta.base_serializer`, created when needed."""
+        try:
+            return self._base_serializer
+        except AttributeError:
+            self._base_serializer = self.base_serializer_class()
+            return self._base_serializer
 
     def get_sideload_ids(self, data):
         """
@@ -137,36 +1030,234 @@ class SideloadListSerializer(SideloadSerializerMixin, ListSerializer):
                 value is a list of ids for that model type.
 
         """
-        sideload_list = []
-        for item in data:
-            sideload_list.append(self.child.get_sideload_ids(item))
+        if not isinstance(data, (list, tuple)):
+            data = list(data)
+        return self.collect_sideload_ids(data)
+
+    def validate_query_params(self):
+        """
+        Check the `include`, `exclude` and `fields[<key>]` query parameters
+        of the request.
+
+        Streaming responses are sent before any record is serialized, so
+        they call this first to report unknown names as a validation error.
+        """
+        self.get_records_serializer(
+            self.base_serializer_class, pluralize(self.base_key))
+        for conf in self.get_included_sideloads():
+            self.get_records_serializer(conf.serializer, conf.key_name)
+
+    def iter_sections(self, instance, chunk_size=None):
+        """
+        Serialize `instance` one chunk of records at a time.
+
+        Yields a `(key, serializer, rows)` tuple for the primary records and
+        for each sideload, where `rows` is a generator of serialized records.
+        Sideload ids are collected while the primary rows are consumed, so
+        each section must be fully consumed before the next one.
+        """
+        chunk_size = chunk_size or self.stream_chunk_size
+        base_class = self.base_serializer_class
+        primary_key = pluralize(self.base_key)
+        instance = self.optimize_queryset(
+            instance, self.get_records_serializer(base_class, primary_key),
+            self.get_sparse_fields(primary_key) is not None)
         sideload_ids = defaultdict(set)
-        for sideload_dict in sideload_list:
-            for key, value in sideload_dict.items():
-                sideload_ids[key].update(value)
-        return sideload_ids
+        primary_pks = set()
+
+        def primary_rows():
+            for chunk in iter_chunks(instance, chunk_size):
+                primary_pks.update(self.get_primary_pks(chunk))
+                for key, ids in self.get_sideload_ids(chunk).items():
+                    sideload_ids[key].update(ids)
+                serializer = self.get_records_serializer(
+                    base_class, primary_key)
+                serializer.instance = chunk
+                data = serializer.data
+                for row in data:
+                    yield row
+
+        def sideload_rows(conf):
+            ids = list(sideload_ids[conf.key_name])
+            for start in range(0, len(ids), chunk_size):
+                serializer = self.get_records_serializer(
+                    conf.serializer, conf.key_name)
+                queryset = self.optimize_queryset(
+                    conf.queryset.filter(pk__in=ids[start:start + chunk_size]),
+                    serializer,
+                    self.get_sparse_fields(conf.key_name) is not None)
+                serializer.instance = queryset
+                data = serializer.data
+                for row in data:
+                    yield row
+
+        yield (self.get_primary_key(),
+               self.get_records_serializer(base_class, primary_key),
+               primary_rows())
+        self.exclude_loaded_ids(sideload_ids, primary_pks)
+        seen = set()
+        for conf in self.get_included_sideloads():
+            if conf.key_name in seen:
+                continue
+            seen.add(conf.key_name)
+            yield (self.get_sideload_key(conf.key_name),
+                   self.get_records_serializer(conf.serializer, conf.key_name),
+                   sideload_rows(conf))
 
     def to_representation(self, instance):
         """
         Overrides to nest the primary record and add sideloads.
         """
+        key = self.get_primary_key()
+        sparse = self.get_sparse_fields(key) is not None
+        serializer = self.get_records_serializer(
+            self.base_serializer_class, key)
+        instance = self.optimize_queryset(instance, serializer, sparse)
+        serializer.instance = instance
+        base_data = serializer.data
+        if not sparse:
+            get_identity_map(self.context).add_many(
+                self.base_serializer_class, instance, base_data)
         ret = OrderedDict()
-        base_data = self.base_serializer.__class__(
-            instance,
-            many=True,
-            context=self.context
-        ).data
-        ret[pluralize(self.base_key)] = base_data
-        ret.update(self.get_sideload_objects(instance))
+        ret[key] = base_data
+        for key, value in self.get_sideload_objects(instance).items():
+            ret[self.get_sideload_key(key)] = value
         return ret
 
+    def get_primary_key(self):
+        return pluralize(self.base_key)
+
+    def get_instances_to_update(self, data):
+        """
+        Get a dictionary of the instances to update keyed by pk, fetching
+        only the records referenced in `data` if `instance` is a queryset.
+        """
+        pk_field = self.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item.get(pk_field.name)))
+            except (AttributeError, DjangoValidationError):
+                continue
+        instances = self.instance
+        if isinstance(instances, QuerySet):
+            instances = instances.filter(pk__in=[pk for pk in pks if pk])
+        self._instances_to_update = dict([(obj.pk, obj) for obj in instances])
+        return self._instances_to_update
+
+    def to_internal_value(self, data):
+        """
+        Validate each record with its own instance of the base serializer,
+        so its validators and `.validate()` run as they would for a single
+        record.  When updating, the pk of each record is kept in its
+        validated data.
+        """
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(
+                input_type=type(data).__name__)
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [message]})
+        pk_field = self.model._meta.pk
+        instances = None
+        if self.instance is not None:
+            instances = self.get_instances_to_update(data)
+
+        base_class = self.base_serializer_class
+        ret = []
+        errors = []
+        for item in data:
+            instance = None
+            try:
+                if instances is not None:
+                    try:
+                        instance = instances[pk_field.to_python(
+                            item.get(pk_field.name))]
+                    except (AttributeError, KeyError, DjangoValidationError):
+                        raise ValidationError(
+                            {pk_field.name: ['Record not found.']})
+                serializer = base_class(
+                    instance, data=item, partial=self.partial,
+                    context=self.context)
+                validated = serializer.run_validation(item)
+            except ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                if instance is not None:
+                    validated[pk_field.name] = instance.pk
+                ret.append(validated)
+                errors.append({})
+
+        if any(errors):
+            raise ValidationError(errors)
+        return ret
+
+    def create(self, validated_data):
+        """
+        Create all records in one transaction.
+
+        Records are inserted with `bulk_create()` when the database returns
+        the ids of the inserted rows and there are no many-to-many values to
+        set.  Otherwise the base serializer creates each record.
+        """
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            return create_records(
+                self.base_serializer_class, self.model, validated_data,
+                self.context, self.bulk_batch_size)
+
+    def update(self, instance, validated_data):
+        """
+        Update all records in one transaction, with batched updates when
+        there are no many-to-many values to set and the base serializer does
+        not override `update()`.
+        """
+        pk_name = self.model._meta.pk.name
+        instances = getattr(self, '_instances_to_update', None)
+        if instances is None:
+            instances = self.get_instances_to_update(validated_data)
+        db = router.db_for_write(self.model)
+        with transaction.atomic(using=db):
+            if not can_bulk_write(self.base_serializer_class, self.model,
+                                  validated_data, 'update'):
+                serializer = self.base_serializer_class(
+                    context=self.context)
+                return [serializer.update(instances[attrs.pop(pk_name)],
+                                          attrs)
+                        for attrs in validated_data]
+            updated = []
+            fields = set()
+            for attrs in validated_data:
+                obj = instances[attrs.pop(pk_name)]
+                for attr, value in attrs.items():
+                    setattr(obj, attr, value)
+                    fields.add(attr)
+                updated.append(obj)
+            if fields:
+                compat.bulk_update(
+                    self.model._default_manager.db_manager(db).all(),
+                    updated, sorted(fields), batch_size=self.bulk_batch_size)
+                notify_bulk_write(self.model, [obj.pk for obj in updated])
+            return updated
+
+    def save(self, **kwargs):
+        clear_identity_map(self.context)
+        return super(SideloadListSerializer, self).save(**kwargs)
+
     @property
     def data(self):
         ret = super(ListSerializer, self).data
         return ReturnDict(ret, serializer=self)
 
 
+EmbeddedRecord = namedtuple('EmbeddedRecord', [
+    'key', 'index', 'serializer_class', 'model', 'data', 'references'])
+
+
 class SideloadSerializer(SideloadSerializerMixin, Serializer):
+    embedded_batch_size = 500
+    # payload keys of the temporary ids of new embedded records, as parsed
+    # by `EmberJSONParser` (`clientId`) and `ActiveModelJSONParser`
+    # (`client_id`, whose `_id` suffix is removed)
+    client_id_fields = ('client_id', 'client')
 
     def __init__(self, instance=None, data=empty, **kwargs):
         """
@@ -176,17 +1267,16 @@ class SideloadSerializer(SideloadSerializerMixin, Serializer):
         that already has the relevant configuration.
         """
         self.is_nested = hasattr(self, 'parent')
+        self.embedded_data = OrderedDict()
         if self.is_nested:
             self.base_serializer = self.parent.base_serializer
             self.sideloads = self.parent.sideloads
             self.base_key = self.parent.base_key
             self.base_key_plural = self.parent.base_key_plural
         else:
-            base_serializer = self.Meta.base_serializer
-            self.model = base_serializer.Meta.model
-            self.base_key = getattr(
-                base_serializer.Meta, 'base_key',
-                get_ember_json_key_for_model(self.model, True))
+            self._configure_sideloads(self.__class__)
+            self.base_serializer_class = self.Meta.base_serializer
+            root_data = data
             if data is not empty:
                 if not isinstance(data, dict):
                     raise AssertionError('`data` must be a `dict`.')
@@ -195,9 +1285,14 @@ class SideloadSerializer(SideloadSerializerMixin, Serializer):
                         'You must nest the attributes for the new object '
                         'under a root key: %s' % self.base_key)
                 data = data[self.base_key]
-            self.base_serializer = base_serializer(
-                instance=instance, data=data, **kwargs)
-            self._configure_sideloads(self.Meta)
+            self._base_serializer_kwargs = dict(
+                kwargs, instance=instance, data=data)
+            if root_data is not empty and self.writable_sideloads:
+                # records of sideloaded models to create with this one
+                for conf in self.sideloads:
+                    if conf.key_name in root_data:
+                        self.embedded_data[conf.key_name] = \
+                            root_data[conf.key_name]
         super(SideloadSerializer, self).__init__(instance, data, **kwargs)
 
     @classmethod
@@ -205,7 +1300,10 @@ class SideloadSerializer(SideloadSerializerMixin, Serializer):
         """
         Override `.many_init()` to create a SideloadListSerializer instance.
         """
-        child_serializer = cls(*args, **kwargs)
+        # the list serializer handles the data, which is nested under the
+        # plural root key
+        child_serializer = cls(*args[:1], **dict([
+            (key, value) for key, value in kwargs.items() if key != 'data']))
         list_kwargs = {'child': child_serializer}
         list_kwargs.update(dict([
             (key, value) for key, value in kwargs.items()
@@ -213,34 +1311,63 @@ class SideloadSerializer(SideloadSerializerMixin, Serializer):
         ]))
         return SideloadListSerializer(*args, **list_kwargs)
 
+    @property
+    def base_serializer(self):
+        """An instance of `Meta.base_serializer`, created when needed."""
+        try:
+            return self._base_serializer
+        except AttributeError:
+            self._base_serializer = self.base_serializer_class(
+                **self._base_serializer_kwargs)
+            return self._base_serializer
+
+    @base_serializer.setter
+    def base_serializer(self, serializer):
+        self._base_serializer = serializer
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Apply eager loading for `Meta.base_serializer` to `queryset`.
+
+        Useful in a view's `get_queryset()` when `Meta.eager_load` is not
+        set.
+        """
+        return optimize_queryset(queryset, cls.Meta.base_serializer())
+
     def get_sideload_ids(self, instance):
         """
         Returns a dictionary of model ids to sideload.
         """
-        sideload_ids = defaultdict(set)
-        for config in self.sideloads:
-            attribute = config.field.get_attribute(instance)
-            if isinstance(attribute, (list, QuerySet)):
-                sideload_ids[config.key_name].update([a.pk for a in attribute])
-            else:
-                sideload_ids[config.key_name].add(attribute.pk if attribute else None)
-        return sideload_ids
+        return self.collect_sideload_ids([instance])
 
     def to_representation(self, instance):
         """
         Overrides the DRF method to add a root key and sideloads.
         """
         # self.base_serializer.instance = instance
+        key = pluralize(self.base_key)
+        names = self.get_sparse_fields(key)
+        if names is not None:
+            trim_fields(self.base_serializer, names, 'fields[%s]' % key)
         base_result = self.base_serializer.data
         if self.is_nested:
             return base_result
 
+        if names is None:
+            get_identity_map(self.context).add(
+                self.base_serializer_class, self.model, instance.pk,
+                base_result)
         ret = OrderedDict()
-        key = self.base_key
+        key = self.get_primary_key()
         ret[key] = base_result
-        ret.update(self.get_sideload_objects(instance))
+        for key, value in self.get_sideload_objects(instance).items():
+            ret[self.get_sideload_key(key)] = value
         return ret
 
+    def get_primary_key(self):
+        return self.base_key
+
     def to_internal_value(self, data):
         """
         Overrides the DRF method to expect a root key.
@@ -255,20 +1382,293 @@ class SideloadSerializer(SideloadSerializerMixin, Serializer):
         """Proxy `update()` calls to `Meta.base_serializer`. """
         return self.base_serializer.update(instance, validated_data)
 
+    def get_client_id_field(self, serializer_class, data):
+        """
+        Get the key of the temporary id in `data`, skipping keys that are
+        fields of `serializer_class`.
+        """
+        names = [name for name in self.client_id_fields if name in data]
+        if not names:
+            return None
+        fields = self._serializer_fields.get(serializer_class)
+        if fields is None:
+            fields = self._serializer_fields[serializer_class] = set(
+                serializer_class().fields)
+        for name in names:
+            if name not in fields:
+                return name
+        return None
+
+    def is_existing_record(self, serializer_class, model, data):
+        """
+        Check if embedded `data` carries the pk of an existing record, rather
+        than a temporary id.
+        """
+        value = data.get('id')
+        if value is None or \
+                self.get_client_id_field(serializer_class, data) is not None:
+            return False
+        if not isinstance(value, six.string_types):
+            return True
+        try:
+            return model._meta.pk.to_python(value) is not None
+        except DjangoValidationError:
+            return False
+
+    def get_temporary_id(self, record):
+        """
+        Get the temporary id the client assigned to a new record: the value
+        of a `client_id_fields` key, or an `id` that is not a valid pk.
+        """
+        name = self.get_client_id_field(record.serializer_class, record.data)
+        if name is not None:
+            value = record.data[name]
+            if not isinstance(value, six.string_types):
+                raise ValidationError({record.key: [
+                    'Temporary ids must be strings.']})
+            return value
+        if record.index is None and self.instance is not None:
+            return None
+        if self.is_existing_record(
+                record.serializer_class, record.model, record.data):
+            return None
+        return record.data.get('id')
+
+    def get_embedded_records(self):
+        """
+        Get the primary record and the new sideload records embedded in the
+        request, ordered so each record comes after the records whose
+        temporary ids it references.
+
+        Embedded records that carry the pk of an existing record are left
+        untouched.  Other records may have a temporary id assigned by the
+        client, and any reference to it is replaced by the pk of the saved
+        record.
+
+        Returns:
+            list: lists of `EmbeddedRecord`s that can be saved together.
+        """
+        self._serializer_fields = {}
+        records = [EmbeddedRecord(
+            self.base_key, None, self.base_serializer_class, self.model,
+            self.initial_data, {})]
+        configs = self.sideloads_by_key
+        errors = {}
+        for key, items in self.embedded_data.items():
+            if not isinstance(items, list) or \
+                    not all([isinstance(item, dict) for item in items]):
+                errors[key] = ['Expected a list of records.']
+                continue
+            conf = configs[key]
+            records.extend([
+                EmbeddedRecord(key, index, conf.serializer, conf.model, item,
+                               {})
+                for index, item in enumerate(items)
+                if not self.is_existing_record(
+                    conf.serializer, conf.model, item)])
+        if not isinstance(self.initial_data, dict):
+            errors[self.base_key] = ['Expected a record.']
+        if errors:
+            raise ValidationError(errors)
+
+        self._temporary_ids = temporary_ids = {}
+        for position, record in enumerate(records):
+            temporary_id = self.get_temporary_id(record)
+            if temporary_id is None:
+                continue
+            if (record.model, temporary_id) in temporary_ids:
+                raise ValidationError(
+                    {record.key: ['Duplicate id "%s".' % temporary_id]})
+            temporary_ids[(record.model, temporary_id)] = position
+
+        dependencies = []
+        for record in records:
+            depends_on = set()
+            fields = get_reference_fields(
+                record.serializer_class, record.model)
+            for name, (model, to_many) in fields.items():
+                for value in self.get_temporary_references(
+                        record.data.get(name), model, to_many):
+                    depends_on.add(temporary_ids[(model, value)])
+                    record.references[name] = (model, to_many)
+            dependencies.append(depends_on)
+
+        levels = []
+        saved = set()
+        remaining = set(range(len(records)))
+        while remaining:
+            level = sorted([position for position in remaining
+                            if dependencies[position] <= saved])
+            if not level:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Records reference each other in a cycle.']})
+            levels.append([records[position] for position in level])
+            saved.update(level)
+            remaining.difference_update(level)
+        return levels
+
+    def get_temporary_references(self, value, model, to_many):
+        """
+        Get the temporary ids of new records of `model` in the value of a
+        reference field.  Only strings are temporary ids.
+        """
+        values = value if to_many and isinstance(value, list) else [value]
+        return [item for item in values
+                if isinstance(item, six.string_types) and
+                (model, item) in self._temporary_ids]
+
+    def get_record_serializer(self, record, data, partial=False):
+        if record.index is None:
+            return record.serializer_class(
+                self.instance, data=data, partial=partial or self.partial,
+                context=self.context)
+        return record.serializer_class(
+            data=data, partial=partial, context=self.context)
+
+    def add_record_errors(self, errors, record, detail):
+        if record.index is None:
+            errors[record.key] = detail
+        else:
+            errors.setdefault(
+                record.key, [{} for item in self.embedded_data[record.key]])
+            errors[record.key][record.index] = detail
+
+    def validate_embedded_records(self, levels):
+        """
+        Validate each record before anything is saved.
+
+        References to new records are left out, and filled in with the
+        saved instances by `.save_embedded_records()`.
+
+        Returns:
+            dict: the validated serializer of each record, by
+                `(key, index)`.
+        """
+        errors = {}
+        ret = {}
+        for level in levels:
+            for record in level:
+                data = dict(record.data)
+                for name, (model, to_many) in record.references.items():
+                    if to_many:
+                        temporary = self.get_temporary_references(
+                            data[name], model, to_many)
+                        data[name] = [value for value in data[name]
+                                      if value not in temporary]
+                    else:
+                        del data[name]
+                partial = any([not to_many for model, to_many
+                               in record.references.values()])
+                serializer = self.get_record_serializer(
+                    record, data, partial=partial)
+                detail = {}
+                if not serializer.is_valid():
+                    detail.update(serializer.errors)
+                if partial and not (record.index is None and self.partial):
+                    # partial validation skips every required field
+                    for name, field in serializer.fields.items():
+                        if field.required and not field.read_only and \
+                                name not in record.data:
+                            detail[name] = [field.error_messages['required']]
+                if detail:
+                    self.add_record_errors(errors, record, detail)
+                else:
+                    ret[(record.key, record.index)] = serializer
+        if errors:
+            raise ValidationError(errors)
+        return ret
+
+    def get_record_validated_data(self, record, serializer, instances):
+        """
+        Get the validated data of `record` with its references to new
+        records replaced by the saved `instances`.
+        """
+        validated_data = dict(serializer.validated_data)
+        for name, (model, to_many) in record.references.items():
+            source = serializer.fields[name].source
+            saved = [instances[(model, value)] for value in
+                     self.get_temporary_references(
+                         record.data[name], model, to_many)]
+            if to_many:
+                validated_data[source] = \
+                    list(validated_data.get(source, [])) + saved
+            else:
+                validated_data[source] = saved[0]
+        return validated_data
+
+    def save_embedded_records(self, **kwargs):
+        """
+        Save the primary and embedded records in one transaction, inserting
+        the records of each model and level in a batch.
+        """
+        assert hasattr(self, '_embedded_serializers'), (
+            'You must call `.is_valid()` before calling `.save()`.')
+        instances = {}
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            for level in self._embedded_levels:
+                sections = OrderedDict()
+                for record in level:
+                    sections.setdefault(record.key, []).append(record)
+                for key, records in sections.items():
+                    validated_data = []
+                    for record in records:
+                        serializer = self._embedded_serializers[
+                            (record.key, record.index)]
+                        validated_data.append(self.get_record_validated_data(
+                            record, serializer, instances))
+                    if records[0].index is None:
+                        self.base_serializer = serializer
+                        serializer._validated_data = validated_data[0]
+                        saved = [serializer.save(**kwargs)]
+                    else:
+                        saved = create_records(
+                            records[0].serializer_class, records[0].model,
+                            validated_data, self.context,
+                            self.embedded_batch_size)
+                    for record, instance in zip(records, saved):
+                        temporary_id = self.get_temporary_id(record)
+                        if temporary_id is not None:
+                            instances[(record.model, temporary_id)] = instance
+        return self.base_serializer.instance
+
     def is_valid(self, raise_exception=False):
-        """Proxy `.is_valid()` to `Meta.base_serializer`. """
-        return self.base_serializer.is_valid(raise_exception)
+        """
+        Proxy `.is_valid()` to `Meta.base_serializer`, or validate every
+        record if sideloaded records are embedded in the request.
+        """
+        if not self.embedded_data:
+            return self.base_serializer.is_valid(raise_exception)
+        try:
+            self._embedded_levels = self.get_embedded_records()
+            self._embedded_serializers = self.validate_embedded_records(
+                self._embedded_levels)
+        except ValidationError as exc:
+            self._embedded_errors = exc.detail
+        else:
+            self._embedded_errors = {}
+        if self._embedded_errors and raise_exception:
+            raise ValidationError(self._embedded_errors)
+        return not self._embedded_errors
 
     def save(self, **kwargs):
-        self.instance = self.base_serializer.save(**kwargs)
+        clear_identity_map(self.context)
+        if self.embedded_data:
+            self.instance = self.save_embedded_records(**kwargs)
+        else:
+            self.instance = self.base_serializer.save(**kwargs)
         return self.instance
 
     @property
     def errors(self):
         """Proxy `.errors` to `Meta.base_serializer`. """
+        if self.embedded_data:
+            return self._embedded_errors
         return self.base_serializer.errors
 
     @property
     def _validated_data(self):
         """Proxy `.errors` to `Meta.base_serializer`. """
+        if self.embedded_data:
+            return self._embedded_serializers[
+                (self.base_key, None)].validated_data
         return self.base_serializer._validated_data
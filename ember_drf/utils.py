@@ -1,29 +1,210 @@
 from collections import namedtuple
 from inflection import camelize, singularize, pluralize, underscore
 
+from django.conf import settings
+
 from rest_framework.relations import PrimaryKeyRelatedField, ManyRelatedField
-from rest_framework.serializers import ListSerializer
+from rest_framework.serializers import ListSerializer, Serializer
 from rest_framework.utils.serializer_helpers import BoundField
 
+from ember_drf.cache import CacheInfo, LRUCache
 from ember_drf.serializers import SideloadListSerializer, SideloadSerializer
 
-def convert_to_ember_json(data):
-    """Convert all dictionary keys to camel case."""
+class KeyConversionCache(LRUCache):
+    """
+    Bounded, thread-safe memo for key conversion functions.
+
+    API payloads only ever contain a small set of distinct keys, so the
+    regex-heavy `inflection` helpers only need to run once per key.  When
+    `maxsize` entries are stored the least recently used entry is evicted.
+    `maxsize` defaults to the `EMBER_DRF_KEY_CACHE_SIZE` setting, or 1024.
+    """
+
+    def __init__(self, func, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'EMBER_DRF_KEY_CACHE_SIZE', 1024)
+        super(KeyConversionCache, self).__init__(maxsize)
+        self.func = func
+
+    def __call__(self, key):
+        with self._lock:
+            try:
+                # re-insert to mark the entry as most recently used
+                value = self._cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._cache[key] = value
+                self.hits += 1
+                return value
+        value = self.func(key)
+        with self._lock:
+            self.misses += 1
+            self._store(key, value)
+        return value
+
+    def seed(self, keys):
+        """Pre-compute conversions for `keys` without counting misses."""
+        for key in keys:
+            if key not in self._cache:
+                value = self.func(key)
+                with self._lock:
+                    self._store(key, value)
+
+def _camelize_lower(key):
+    return camelize(key, False)
+
+def remove_id_suffixes(string):
+    if string[-3:] == '_id':
+        return string[:-3]
+    elif string[-4:] == '_ids':
+        return pluralize(string[:-4])
+    return string
+
+camelize_key = KeyConversionCache(_camelize_lower)
+underscore_key = KeyConversionCache(underscore)
+remove_id_suffixes_key = KeyConversionCache(remove_id_suffixes)
+
+def camelize_root_key(key):
+    """Camelize a root key, keeping a leading underscore."""
+    if key.startswith('_'):
+        return '_' + camelize_key(key[1:])
+    return camelize_key(key)
+
+def _iter_serializer_keys(serializer):
+    """Yield every output key of `serializer`, including nested ones."""
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    for name, field in serializer.fields.items():
+        yield name
+        if isinstance(field, (ListSerializer, Serializer)):
+            for key in _iter_serializer_keys(field):
+                yield key
+
+def seed_key_caches(*serializer_classes):
+    """
+    Pre-seed the key conversion caches from serializer field names.
+
+    Intended to be called once at startup (e.g. from `AppConfig.ready()`)
+    so that the first requests do not pay for key conversion.
+
+    Args:
+        *serializer_classes: `Serializer` or `SideloadSerializer` classes.
+    """
+    keys = set()
+    for serializer_class in serializer_classes:
+        if issubclass(serializer_class, SideloadSerializer):
+            serializer = serializer_class()
+            keys.update([serializer.base_key, pluralize(serializer.base_key)])
+            for conf in serializer.sideloads:
+                keys.add(conf.key_name)
+                keys.update(_iter_serializer_keys(conf.serializer()))
+            serializer = serializer.base_serializer
+        else:
+            serializer = serializer_class()
+        keys.update(_iter_serializer_keys(serializer))
+    camelize_key.seed(keys)
+    underscore_key.seed([_camelize_lower(key) for key in keys])
+    remove_id_suffixes_key.seed(keys)
+
+def _camelize_keys(data):
     if isinstance(data, dict):
         camel_dict = {}
         for key, value in data.items():
-            camel_dict[camelize(key, False)] = convert_to_ember_json(value)
+            camel_dict[camelize_key(key)] = _camelize_keys(value)
         return camel_dict
     if isinstance(data, (list, tuple)):
-        return [convert_to_ember_json(i) for i in data]
+        return [_camelize_keys(i) for i in data]
     return data
 
+_ember_key_plans = LRUCache()
+
+def get_serializer_cache_key(serializer):
+    """
+    Get a hashable key identifying the output shape of `serializer`.
+
+    The key is made up of the serializer class and its field names, so
+    serializers that add or remove fields dynamically get their own entry.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    return (serializer.__class__, tuple(serializer.fields))
+
+def compile_ember_key_plan(serializer):
+    """
+    Compile the camel case keys for each field of a serializer.
+
+    Args:
+        serializer: a `Serializer` or `ListSerializer` instance.
+    Returns:
+        dict: maps each field name to a tuple of `(camelized name, plan)`
+            where `plan` is the compiled plan of a nested serializer or
+            `None` for any other field.
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    plan = {}
+    for name, field in serializer.fields.items():
+        nested = None
+        if isinstance(field, (ListSerializer, Serializer)):
+            nested = compile_ember_key_plan(field)
+        plan[name] = (camelize_key(name), nested)
+    return plan
+
+def get_ember_key_plan(serializer):
+    """Get the cached `compile_ember_key_plan()` result for `serializer`."""
+    return _ember_key_plans.get(get_serializer_cache_key(serializer),
+                                lambda: compile_ember_key_plan(serializer))
+
+def apply_ember_key_plan(data, plan):
+    """
+    Convert the keys of `data` using a compiled plan.
+
+    Keys that are not part of the plan, and the contents of fields that
+    are not nested serializers, fall back to generic conversion.
+    """
+    if isinstance(data, dict):
+        camel_dict = {}
+        for key, value in data.items():
+            try:
+                new_key, nested = plan[key]
+            except KeyError:
+                camel_dict[camelize_key(key)] = _camelize_keys(value)
+                continue
+            if nested is not None:
+                value = apply_ember_key_plan(value, nested)
+            elif isinstance(value, (dict, list, tuple)):
+                value = _camelize_keys(value)
+            camel_dict[new_key] = value
+        return camel_dict
+    if isinstance(data, (list, tuple)):
+        return [apply_ember_key_plan(i, plan) for i in data]
+    return data
+
+def convert_to_ember_json(data):
+    """
+    Convert all dictionary keys to camel case.
+
+    If `data` is a `ReturnDict` or `ReturnList` with `.serializer` set, the
+    keys are converted with a plan compiled once per serializer class.
+    """
+    try:
+        serializer = data.serializer
+    except AttributeError:
+        return _camelize_keys(data)
+    if isinstance(serializer, (SideloadSerializer, SideloadListSerializer)):
+        camel_dict = {}
+        for key, value in data.items():
+            camel_dict[camelize_root_key(key)] = convert_to_ember_json(value)
+        return camel_dict
+    return apply_ember_key_plan(data, get_ember_key_plan(serializer))
+
 def convert_from_ember_json(data):
     """Convert all dictionary keys to snake_case."""
     if isinstance(data, dict):
         snake_dict = {}
         for key, value in data.items():
-            snake_dict[underscore(key)] = convert_from_ember_json(value)
+            snake_dict[underscore_key(key)] = convert_from_ember_json(value)
         return snake_dict
     if isinstance(data, (list, tuple)):
         return [convert_from_ember_json(i) for i in data]
@@ -79,51 +260,86 @@ def find_related_fields_to_rename(fields, prefix=[]):
             ret.append(RelatedFieldRename(key, new_name))
     return ret
 
-def rename_related_fields(data, fields):
+_related_fields_to_rename = LRUCache()
+
+def get_related_fields_to_rename(serializer, prefix=[]):
     """
-    Rename related fields to ActiveModel json style.
+    Get the cached `find_related_fields_to_rename()` result for `serializer`.
+
+    Results are cached by `prefix`, serializer class and field names so no
+    serializer needs to be constructed once a shape has been seen.
+    """
+    key = (tuple(prefix), get_serializer_cache_key(serializer))
+    return _related_fields_to_rename.get(
+        key, lambda: find_related_fields_to_rename(serializer, prefix=prefix))
+
+def compile_related_field_renames(fields):
+    """
+    Compile a list of `RelatedFieldRename` instances into a prefix tree.
 
     Args:
-        data (dict or list): object to be traversed and renamed.
         fields (list): list of `RelatedFieldRename` instances.
     Returns:
-        dict or list: with all related keys in `fields` renamed as specified.
+        dict: maps each key to a `[new_name, children]` node where
+            `new_name` is set for keys that should be renamed and
+            `children` is the tree to apply to the nested value otherwise.
     """
+    trie = {}
+    for field in fields:
+        node = trie
+        for key in field.index[:-1]:
+            entry = node.setdefault(key, [None, {}])
+            if entry[1] is None:
+                entry[1] = {}
+            node = entry[1]
+        node.setdefault(field.index[-1], [None, None])[0] = field.new_name
+    return trie
 
-    root_fields = [(f.index[0], f.new_name) for f in fields if len(f.index) == 1]
-    nested_fields = [f for f in fields if len(f.index) > 1]
+def apply_related_field_renames(data, trie):
+    """
+    Rename related fields in a single pass using a compiled prefix tree.
 
+    List items share the same subtree, so the cost is linear in the size
+    of `data`.
+    """
     if isinstance(data, dict):
         new_dict = {}
         for key, value in data.items():
-            found_match = False
-
-            # check if any immediate children fields are related fields
-            for field, new_name in root_fields:
-                if key == field:
-                    new_dict[new_name] = value
-                    found_match = True
-                    break
-            if found_match:
-                continue
-
-            # check if any nested fields contain related fields
-            for field in nested_fields:
-                if key == field.index[0]:
-                    new_fields = [
-                        RelatedFieldRename(field.index[1:], field.new_name)
-                        for field in nested_fields
-                    ]
-                    new_dict[key] = rename_related_fields(value, new_fields)
-                    found_match = True
-                    break
-
-            # copy the existing key/value pair for non related fields
-            if not found_match:
+            node = trie.get(key)
+            if node is None:
+                new_dict[key] = value
+            elif node[0] is not None:
+                new_dict[node[0]] = value
+            elif node[1]:
+                new_dict[key] = apply_related_field_renames(value, node[1])
+            else:
                 new_dict[key] = value
         return new_dict
     elif isinstance(data, list):
-        return [rename_related_fields(i, fields) for i in data]
+        return [apply_related_field_renames(i, trie) for i in data]
+    return data
+
+_related_field_rename_tries = LRUCache()
+
+def get_related_field_rename_trie(serializer):
+    """Get the compiled rename tree for `serializer`, cached by shape."""
+    return _related_field_rename_tries.get(
+        get_serializer_cache_key(serializer),
+        lambda: compile_related_field_renames(
+            get_related_fields_to_rename(serializer)))
+
+def rename_related_fields(data, fields):
+    """
+    Rename related fields to ActiveModel json style.
+
+    Args:
+        data (dict or list): object to be traversed and renamed.
+        fields (list): list of `RelatedFieldRename` instances.
+    Returns:
+        dict or list: with all related keys in `fields` renamed as specified.
+    """
+    return apply_related_field_renames(
+        data, compile_related_field_renames(fields))
 
 def convert_to_active_model_json(data):
     try:
@@ -131,24 +347,17 @@ def convert_to_active_model_json(data):
     except AttributeError:
         # do nothing if we are not given a ReturnDict with `.serializer` set.
         return data
-    related_fields = []
+    trie = {}
     if isinstance(serializer, (SideloadSerializer, SideloadListSerializer)):
         for key, value in data.items():
+            if key == 'meta':
+                continue
             assert hasattr(value, 'serializer'), (
                 'Each root key must nest a `ReturnDict` or `ReturnList` with '
                 '`.serializer` set.'
             )
-            related_fields.extend(
-                find_related_fields_to_rename(value.serializer, prefix=[key])
-            )
-    return rename_related_fields(data, related_fields)
-
-def remove_id_suffixes(string):
-    if string[-3:] == '_id':
-        return string[:-3]
-    elif string[-4:] == '_ids':
-        return pluralize(string[:-4])
-    return string
+            trie[key] = [None, get_related_field_rename_trie(value.serializer)]
+    return apply_related_field_renames(data, trie)
 
 def convert_from_active_model_json(data):
     if isinstance(data, list):
@@ -156,7 +365,7 @@ def convert_from_active_model_json(data):
     elif isinstance(data, dict):
         new_dict = {}
         for key, value in data.items():
-            new_dict[remove_id_suffixes(key)] = \
+            new_dict[remove_id_suffixes_key(key)] = \
                 convert_from_active_model_json(value)
         return new_dict
     return data
@@ -1,7 +1,21 @@
+import hashlib
+from collections import OrderedDict
+
+from django.http import (
+    HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.http import quote_etag
+
+from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from rest_framework.views import APIView
 
 from . import compat
+from .cache import get_model_versions, track_model_versions
+from .filters import CoallesceIDsFilterBackend
+from .serializers import get_related_models, select_sideload_keys
 
 
 def exception_handler(exc, context=None):
@@ -20,3 +34,361 @@ def exception_handler(exc, context=None):
         return Response(data, status=422)
     else:
         return compat.get_exception_handler(exc, context)
+
+
+class StreamingListMixin(object):
+    """
+    List a queryset as a `StreamingHttpResponse`.
+
+    Requires `serializer_class` to be a `SideloadSerializer` and the
+    accepted renderer to implement `.stream()`; otherwise a regular
+    `Response` is returned.
+
+    The `include`, `exclude` and `fields[<key>]` query parameters are
+    validated before the response starts.
+    """
+    stream_chunk_size = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
+        renderer = request.accepted_renderer
+        if not hasattr(renderer, 'stream') or \
+                not hasattr(serializer, 'iter_sections'):
+            return Response(serializer.data)
+        # errors raised while streaming cannot change the status code
+        serializer.validate_query_params()
+        return StreamingHttpResponse(
+            renderer.stream(serializer, self.stream_chunk_size),
+            content_type=renderer.media_type
+        )
+
+
+def etag_matches(request, etag):
+    """Check if `etag` matches the `If-None-Match` header of `request`."""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or \
+        if_none_match.strip() == '*'
+
+
+# models the responses of each serializer class depend on
+_response_cache_models = {}
+
+
+class CachedResponseMixin(object):
+    """
+    Cache the rendered content of `list()` and `retrieve()` responses.
+
+    Cache keys are built from the request path, query parameters, accepted
+    media type, user and a version counter for the base model, every model
+    in `Meta.sideloads` and the models their relation fields and nested
+    serializers read.  Saving or deleting any of those models bumps its
+    version.  Models read in other ways (e.g. by a method field) must be
+    added to `response_cache_models`.  On a hit, the view skips
+    serialization and rendering entirely, and the cached headers (e.g.
+    `ETag`) are restored, or `304 Not Modified` is returned if the ETag
+    matches `If-None-Match`.
+
+    The cache should be listed in `EMBER_DRF_SHARED_CACHES`, its models in
+    `EMBER_DRF_CACHED_MODELS` (and `ember_drf` in `INSTALLED_APPS`) so that
+    every process bumps the versions.
+    """
+    response_cache = 'default'
+    response_cache_timeout = 300
+    response_cache_key_prefix = 'ember_drf'
+    # additional models the response depends on
+    response_cache_models = ()
+
+    def get_response_cache(self):
+        return compat.get_cache(self.response_cache)
+
+    def get_response_cache_models(self):
+        serializer_class = self.get_serializer_class()
+        try:
+            models = _response_cache_models[serializer_class]
+        except KeyError:
+            meta = serializer_class.Meta
+            base_serializer = getattr(meta, 'base_serializer',
+                                      serializer_class)
+            model = base_serializer.Meta.model
+            serializers = [(model, base_serializer)] + [
+                (conf[0], conf[1]) for conf in getattr(meta, 'sideloads', [])]
+            models = []
+            for model, serializer in serializers:
+                models.append(model)
+                models.extend(get_related_models(serializer(), model))
+            models = _response_cache_models[serializer_class] = list(
+                OrderedDict.fromkeys(models))
+        return models + [model for model in self.response_cache_models
+                         if model not in models]
+
+    def get_response_cache_key(self, request):
+        cache = self.get_response_cache()
+        prefix = self.response_cache_key_prefix
+        models = self.get_response_cache_models()
+        for model in models:
+            track_model_versions(model, self.response_cache, prefix)
+        query_params = compat.get_request_query_params(request)
+        raw = repr((
+            request.path,
+            sorted([(key, sorted(values))
+                    for key, values in query_params.lists()]),
+            request.accepted_media_type,
+            getattr(getattr(request, 'user', None), 'pk', None),
+            get_model_versions(models, cache, prefix),
+        ))
+        return '%s:response:%s' % (
+            prefix, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = self.get_response_cache()
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            etag = dict(headers).get('ETag')
+            if etag is not None and etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+            response = HttpResponse(content)
+            for name, value in headers:
+                response[name] = value
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(
+                response, 'add_post_render_callback'):
+            def store(response):
+                cache.set(key, (response.content, list(response.items())),
+                          self.response_cache_timeout)
+            response.add_post_render_callback(store)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super(CachedResponseMixin, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super(CachedResponseMixin, self).retrieve, request, *args,
+            **kwargs)
+
+
+class ConditionalGetMixin(object):
+    """
+    Answer `If-None-Match` with `304 Not Modified` without serializing.
+
+    The ETag is computed by `SideloadSerializer.get_fingerprint()` from the
+    primary and sideloaded ids and the maximum of `etag_fields` (e.g.
+    `updated_at`) for each model, using a few cheap queries.  Paginated
+    lists only fingerprint the page that is rendered, along with the links to
+    the next and previous pages.
+    """
+    etag_fields = ()
+
+    def get_etag(self, request, queryset, many, variant=()):
+        """
+        Get the ETag of `queryset`, which also depends on the accepted media
+        type and the values in `variant`.
+        """
+        serializer = self.get_serializer(many=many)
+        fingerprint = serializer.get_fingerprint(queryset, self.etag_fields)
+        variant = repr((request.accepted_media_type,) + tuple(variant))
+        return quote_etag('%s-%s' % (fingerprint, hashlib.md5(
+            variant.encode('utf-8')).hexdigest()[:8]))
+
+    def get_conditional_response(self, request, queryset, many, handler,
+                                 variant=()):
+        """
+        Returns `304 Not Modified` if the ETag of `queryset` matches, or the
+        response of `handler()` otherwise.
+        """
+        etag = self.get_etag(request, queryset, many, variant)
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = handler()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+
+        def handler():
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+        if page is None:
+            return self.get_conditional_response(
+                request, queryset, True, handler)
+        # a page that gains a next or previous page is modified
+        links = (self.paginator.get_next_link(),
+                 self.paginator.get_previous_link())
+        return self.get_conditional_response(
+            request, page, True, handler, links)
+
+    def retrieve(self, request, *args, **kwargs):
+        # a missing object is a 404, even for `If-None-Match: *`
+        instance = self.get_object()
+
+        def handler():
+            return Response(self.get_serializer(instance).data)
+        return self.get_conditional_response(
+            request, [instance], False, handler)
+
+
+class BatchView(APIView):
+    """
+    Answer coalesced finds for several types in a single request.
+
+    Each `SideloadSerializer` in `serializer_classes` is requested with its
+    plural root key, e.g.
+    `?parent_models[]=1&child_models[]=2&child_models[]=3`.  The results are
+    merged into one sideload-shaped payload in which each record appears at
+    most once.
+
+    The `include` and `exclude` query parameters are checked against the
+    sideload keys of all the serializers, and each serializer includes the
+    selected keys it has.
+
+    Records are looked up in the querysets given by `querysets`, keyed by
+    serializer class, or by overriding `get_queryset()` (e.g. to apply the
+    same owner filtering as the views of each type).
+    """
+    serializer_classes = ()
+    querysets = {}
+    filter_backend_class = CoallesceIDsFilterBackend
+    include_query_param = 'include'
+    exclude_query_param = 'exclude'
+
+    def get_serializer_context(self):
+        return {
+            'request': self.request,
+            'format': self.format_kwarg,
+            'view': self
+        }
+
+    def get_queryset(self, serializer_class):
+        """Get the queryset to find the records of `serializer_class` in."""
+        queryset = self.querysets.get(serializer_class)
+        assert queryset is not None, (
+            "'%s' should either include a queryset for %s in `querysets`, "
+            "or override the `get_queryset()` method."
+            % (self.__class__.__name__, serializer_class.__name__))
+        return queryset.all()
+
+    def get_serializers(self):
+        """
+        Get a dictionary of `SideloadListSerializer`s keyed by the plural
+        root key of their records.
+        """
+        ret = {}
+        context = self.get_serializer_context()
+        for serializer_class in self.serializer_classes:
+            serializer = serializer_class(many=True, context=context)
+            ret[serializer.get_primary_key()] = serializer
+        key_names = set()
+        for serializer in ret.values():
+            key_names.update(serializer.sideloads_by_key)
+        # the serializers share the context
+        context['included_sideloads'] = select_sideload_keys(
+            compat.get_request_query_params(self.request), key_names,
+            self.include_query_param, self.exclude_query_param)
+        return ret
+
+    def merge(self, results):
+        """
+        Merge serialized sideload payloads, dropping duplicate records.
+        """
+        ret = OrderedDict()
+        seen = {}
+        for data in results:
+            for key, rows in data.items():
+                if key not in ret:
+                    ret[key] = ReturnList(serializer=rows.serializer)
+                    seen[key] = set()
+                for row in rows:
+                    if row['id'] not in seen[key]:
+                        seen[key].add(row['id'])
+                        ret[key].append(row)
+        # sideloads of a requested type are nested under `_<key>`
+        for key in [k for k in ret if k.startswith('_') and k[1:] in ret]:
+            ret[key][:] = [row for row in ret[key]
+                           if row['id'] not in seen[key[1:]]]
+            if not ret[key]:
+                del ret[key]
+        return ret
+
+    def get(self, request, *args, **kwargs):
+        backend = self.filter_backend_class()
+        query_params = compat.get_request_query_params(request)
+        results = []
+        serializers = self.get_serializers()
+        for key in sorted(serializers):
+            serializer = serializers[key]
+            param = key + '[]'
+            values = query_params.getlist(param)
+            if not values:
+                continue
+            queryset = self.get_queryset(serializer.child.__class__)
+            ids = backend.clean_ids(values, queryset.model, self, param)
+            serializer.instance = backend.filter_ids(queryset, ids)
+            results.append(serializer.data)
+        # the renderers only need a sideload serializer at the root, each
+        # root key carries the serializer of its own records
+        root = serializers[min(serializers)] if serializers else None
+        return Response(ReturnDict(self.merge(results), serializer=root))
+
+
+class BulkWriteMixin(object):
+    """
+    Create and update many records in one request and one transaction.
+
+    A `POST` whose records are nested under the plural root key creates all
+    of them.  `PUT` and `PATCH` requests to the list endpoint update the
+    records with the ids in the payload.
+    """
+
+    def is_bulk_request(self, request):
+        serializer = self.get_serializer(many=True)
+        return isinstance(request.data, dict) and \
+            serializer.get_primary_key() in request.data
+
+    def create(self, request, *args, **kwargs):
+        if not self.is_bulk_request(request):
+            return super(BulkWriteMixin, self).create(
+                request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, serializer):
+        serializer.save()
+
+    def bulk_update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(
+            self.filter_queryset(self.get_queryset()), data=request.data,
+            many=True, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_update(serializer)
+        return Response(serializer.data)
+
+    def perform_bulk_update(self, serializer):
+        serializer.save()
+
+    def partial_bulk_update(self, request, *args, **kwargs):
+        kwargs['partial'] = True
+        return self.bulk_update(request, *args, **kwargs)
+
+    def put(self, request, *args, **kwargs):
+        return self.bulk_update(request, *args, **kwargs)
+
+    def patch(self, request, *args, **kwargs):
+        return self.partial_bulk_update(request, *args, **kwargs)
@@ -35,6 +35,7 @@ def pytest_configure():
             'django.contrib.messages',
             'django.contrib.staticfiles',
             'rest_framework',
+            'ember_drf',
             'tests',
         ),
         REST_FRAMEWORK={
@@ -53,7 +54,8 @@ def pytest_configure():
           ),
           'EXCEPTION_HANDLER': 'ember_drf.views.exception_handler',
           'TEST_REQUEST_DEFAULT_FORMAT': 'json',
-        }
+        },
+        EMBER_DRF_CACHED_MODELS=('tests.ParentModel',),
     )
 
     try:
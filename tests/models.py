@@ -1,3 +1,5 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 
@@ -37,3 +39,24 @@ class ReverseOneToOne(TestModel):
 class OneToOne(TestModel):
     reverse_one_to_one = models.OneToOneField(
         ReverseOneToOne, related_name='one_to_one')
+
+class CategoryModel(TestModel):
+    parent = models.ForeignKey('self', blank=True, null=True,
+                               related_name='children')
+
+class ActivityModel(TestModel):
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    subject = GenericForeignKey('content_type', 'object_id')
+
+class CodeModel(TestModel):
+    code = models.CharField(max_length=10, unique=True)
+
+class CodeReferenceModel(TestModel):
+    code = models.ForeignKey(CodeModel, to_field='code')
+
+class SlugModel(TestModel):
+    slug = models.CharField(max_length=10, primary_key=True)
+
+class SlugReferenceModel(TestModel):
+    slug = models.ForeignKey(SlugModel)
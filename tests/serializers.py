@@ -1,9 +1,11 @@
 from rest_framework import serializers
 
-from ember_drf.serializers import SideloadSerializer
+from ember_drf.cache import SideloadCache
+from ember_drf.serializers import IdentityMapMixin, SideloadSerializer
 
 from tests.models import ChildModel, ParentModel, OptionalChildModel, \
-    OneToOne, ReverseOneToOne
+    OneToOne, ReverseOneToOne, CategoryModel, ActivityModel, CodeModel, \
+    CodeReferenceModel, SlugModel, SlugReferenceModel
 
 
 class ChildSerializer(serializers.ModelSerializer):
@@ -48,6 +50,17 @@ class NestedChildSideloadSerializer(SideloadSerializer):
     class Meta:
         base_serializer = NestedChildSerializer
 
+class NestedChildWithSideloadsSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = NestedChildSerializer
+        sideloads = [(ParentModel, ParentSerializer)]
+
+class EagerNestedChildSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = NestedChildSerializer
+        sideloads = [(ParentModel, ParentSerializer)]
+        eager_load = True
+
 class NestedParentSideloadSerializer(SideloadSerializer):
     class Meta:
         base_serializer = NestedParentSerializer
@@ -93,3 +106,116 @@ class ParentSideloadSerializerWithContext(SideloadSerializer):
         model = ParentModel
         base_serializer = ParentSerializer
         sideloads = [(ChildModel, ChildSerializerUsingParentContext)]
+
+class IdentityMapParentSerializer(IdentityMapMixin, ParentSerializer):
+    pass
+
+class IdentityMapNestedChildSerializer(ChildSerializer):
+    parent = IdentityMapParentSerializer()
+    old_parent = IdentityMapParentSerializer()
+
+class IdentityMapChildSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = IdentityMapNestedChildSerializer
+        sideloads = [(ParentModel, IdentityMapParentSerializer)]
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryModel
+        fields = ('id', 'parent', 'children')
+
+class CategorySideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = CategorySerializer
+        sideloads = [(CategoryModel, CategorySerializer)]
+
+class TransitiveCategorySideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = CategorySerializer
+        sideloads = [(CategoryModel, CategorySerializer)]
+        sideload_depth = 2
+
+class CategoryParentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryModel
+        fields = ('id', 'parent')
+
+class TransitiveCategoryParentSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = CategoryParentSerializer
+        sideloads = [(CategoryModel, CategoryParentSerializer)]
+        sideload_depth = 2
+
+class CachedChildSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = ChildSerializer
+        sideloads = [(ParentModel, ParentSerializer)]
+        sideload_caches = {ParentModel: SideloadCache(key_prefix='tests')}
+
+class ActivitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityModel
+        fields = ('id', 'content_type', 'object_id')
+
+class ActivitySideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = ActivitySerializer
+        sideloads = [(ParentModel, ParentSerializer),
+                     (ChildModel, ChildSerializer)]
+
+class CodeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CodeModel
+
+class CodeReferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CodeReferenceModel
+
+class CodeReferenceSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = CodeReferenceSerializer
+        sideloads = [(CodeModel, CodeSerializer)]
+
+class SlugSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlugModel
+
+class SlugReferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlugReferenceModel
+
+class SlugReferenceSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = SlugReferenceSerializer
+        sideloads = [(SlugModel, SlugSerializer)]
+
+class RecordingChildSerializer(ChildSerializer):
+    updated = []
+
+    def update(self, instance, validated_data):
+        self.updated.append(instance.pk)
+        return super(RecordingChildSerializer, self).update(
+            instance, validated_data)
+
+class RecordingChildSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = RecordingChildSerializer
+
+class WritableParentSideloadSerializer(SideloadSerializer):
+    class Meta:
+        model = ParentModel
+        base_serializer = ParentSerializer
+        sideloads = [(ChildModel, ChildSerializer)]
+        writable_sideloads = True
+
+class WritableChildSideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = ChildSerializer
+        sideloads = [(ParentModel, ParentSerializer)]
+        writable_sideloads = True
+
+class WritableCategorySideloadSerializer(SideloadSerializer):
+    class Meta:
+        base_serializer = CategorySerializer
+        sideloads = [(CategoryModel, CategorySerializer)]
+        writable_sideloads = True
@@ -0,0 +1,135 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ember_drf.cache import (
+    SideloadCache, connect_signals, get_model_versions, get_record_key,
+    notify_bulk_write
+)
+from ember_drf.compat import get_cache
+
+from tests.models import ChildModel, CodeModel, ParentModel, SlugModel
+from tests.serializers import CachedChildSideloadSerializer
+
+
+class TestSideloadCache(TestCase):
+
+    def setUp(self):
+        self.cache = CachedChildSideloadSerializer.Meta.sideload_caches[
+            ParentModel]
+        self.cache.cache.clear()
+        self.cache.hits = self.cache.misses = 0
+        self.parent = ParentModel.objects.create()
+        self.old_parent = ParentModel.objects.create()
+        self.child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.old_parent)
+
+    def serialize(self, context=None):
+        return CachedChildSideloadSerializer(
+            self.child, context=context or {}).data
+
+    def test_cache_hit_skips_query(self):
+        first = self.serialize()
+        self.assertEqual(self.cache.info(), {'hits': 0, 'misses': 2})
+        with self.assertNumQueries(0):
+            second = self.serialize()
+        self.assertEqual(self.cache.info(), {'hits': 2, 'misses': 2})
+        self.assertEqual(
+            sorted(p['id'] for p in second['parent_models']),
+            sorted(p['id'] for p in first['parent_models']))
+
+    def test_save_invalidates(self):
+        self.serialize()
+        self.parent.text = 'changed'
+        self.parent.save()
+        result = self.serialize()
+        self.assertEqual(self.cache.info()['hits'], 1)
+        self.assertIn('changed', [p['text'] for p in result['parent_models']])
+
+    def test_delete_invalidates(self):
+        self.serialize()
+        serializer_class = CachedChildSideloadSerializer.Meta.sideloads[0][1]
+        pks = [self.parent.pk, self.old_parent.pk]
+        self.assertEqual(
+            len(self.cache.get_many(ParentModel, serializer_class, pks)), 2)
+        self.old_parent.delete()
+        self.assertEqual(
+            list(self.cache.get_many(ParentModel, serializer_class, pks)),
+            [self.parent.pk])
+
+    def test_records_are_not_shared_between_users(self):
+        def get_context(user):
+            request = Request(APIRequestFactory().get('/'))
+            request.user = user
+            return {'request': request}
+
+        users = [User.objects.create(username=name) for name in 'ab']
+        self.serialize(get_context(users[0]))
+        self.serialize(get_context(users[1]))
+        self.assertEqual(self.cache.info(), {'hits': 0, 'misses': 4})
+        self.serialize(get_context(users[1]))
+        self.assertEqual(self.cache.info(), {'hits': 2, 'misses': 4})
+
+    def test_variants_are_stored_separately(self):
+        def get_context(user):
+            request = Request(APIRequestFactory().get('/'))
+            request.user = user
+            return {'request': request}
+
+        users = [User.objects.create(username=name) for name in 'ab']
+        for user in users:
+            self.serialize(get_context(user))
+        generation = self.cache.cache.get(
+            self.cache.make_key(ParentModel, self.parent.pk))
+        self.assertFalse(isinstance(generation, dict))
+        self.parent.save()
+        for user in users:
+            self.serialize(get_context(user))
+        # the saved parent misses for both users, the other one hits
+        self.assertEqual(self.cache.info(), {'hits': 2, 'misses': 6})
+
+
+class TestSharedCacheInvalidation(TestCase):
+
+    def test_unwatched_model_is_invalidated(self):
+        # as if another process had cached the record
+        cache = SideloadCache(cache='default')
+        parent = ParentModel.objects.create()
+        serializer_class = CachedChildSideloadSerializer.Meta.sideloads[0][1]
+        cache.set_many(ParentModel, serializer_class, {parent.pk: {}})
+        parent.save()
+        self.assertEqual(
+            get_cache('default').get(cache.make_key(ParentModel, parent.pk)),
+            None)
+
+    def test_notify_bulk_write(self):
+        cache = CachedChildSideloadSerializer.Meta.sideload_caches[ParentModel]
+        serializer_class = CachedChildSideloadSerializer.Meta.sideloads[0][1]
+        parent = ParentModel.objects.create()
+        CachedChildSideloadSerializer(ChildModel.objects.create(
+            parent=parent, old_parent=parent), context={}).data
+        version = get_model_versions([ParentModel], get_cache('default'))
+        notify_bulk_write(ParentModel, [parent.pk])
+        self.assertEqual(
+            cache.get_many(ParentModel, serializer_class, [parent.pk]), {})
+        self.assertNotEqual(
+            get_model_versions([ParentModel], get_cache('default')), version)
+
+    def test_only_cached_models_are_invalidated(self):
+        code = CodeModel.objects.create(code='a')
+        key = get_record_key(CodeModel, code.pk)
+        get_cache('default').set(key, 'generation')
+        code.save()
+        self.assertEqual(get_cache('default').get(key), 'generation')
+
+    def test_cached_models_setting(self):
+        slug = SlugModel.objects.create(slug='a')
+        key = get_record_key(SlugModel, slug.pk)
+        with override_settings(EMBER_DRF_CACHED_MODELS=['tests.SlugModel']):
+            connect_signals()
+        get_cache('default').set(key, 'generation')
+        slug.save()
+        self.assertEqual(get_cache('default').get(key), None)
@@ -0,0 +1,75 @@
+from django.test import TestCase
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ember_drf.filters import CoallesceIDsFilterBackend
+
+from tests.models import ParentModel, SlugModel
+
+factory = APIRequestFactory()
+
+
+class View(object):
+    pass
+
+
+class CoallesceIDsFilterBackendTests(TestCase):
+
+    def setUp(self):
+        self.parents = [ParentModel.objects.create() for x in range(3)]
+        self.backend = CoallesceIDsFilterBackend()
+
+    def filter(self, ids, view=None):
+        request = Request(factory.get('/', {'ids[]': ids}))
+        return self.backend.filter_queryset(
+            request, ParentModel.objects.all(), view or View())
+
+    def test_no_ids(self):
+        self.assertEqual(self.filter([]).count(), 3)
+
+    def test_filter_ids(self):
+        ids = [str(self.parents[0].pk), str(self.parents[2].pk)]
+        self.assertEqual(sorted(p.pk for p in self.filter(ids)),
+                         [self.parents[0].pk, self.parents[2].pk])
+
+    def test_deduplicates_ids(self):
+        request = Request(factory.get(
+            '/', {'ids[]': ['1', '1', '2', '01']}))
+        ids = self.backend.get_ids(
+            request, ParentModel.objects.all(), View())
+        self.assertEqual(ids, [1, 2])
+
+    def test_invalid_id(self):
+        with self.assertRaises(ValidationError):
+            self.filter(['1', 'abc'])
+
+    def test_max_ids(self):
+        view = View()
+        view.max_coalesced_ids = 2
+        with self.assertRaises(ValidationError):
+            self.filter(['1', '2', '3'], view)
+        self.assertEqual(self.filter(['1', '2'], view).count(), 2)
+
+    def test_many_ids(self):
+        ids = [str(pk) for pk in range(1, 1500)]
+        with self.assertNumQueries(1):
+            result = list(self.filter(ids))
+        self.assertEqual(len(result), 3)
+
+    def test_many_non_integer_ids(self):
+        size = self.backend.max_query_params
+        with self.assertRaises(ValidationError):
+            self.backend.clean_ids(
+                ['z%d' % x for x in range(size + 1)], SlugModel, View())
+
+    def test_non_integer_ids_fit_query_params(self):
+        SlugModel.objects.create(slug='a')
+        size = self.backend.max_query_params
+        ids = self.backend.clean_ids(
+            ['z%d' % x for x in range(size - 1)] + ['a'], SlugModel, View())
+        queryset = self.backend.filter_ids(SlugModel.objects.all(), ids)
+        sql, params = queryset.query.sql_with_params()
+        self.assertLessEqual(len(params), size)
+        self.assertEqual([obj.slug for obj in queryset], ['a'])
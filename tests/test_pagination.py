@@ -0,0 +1,70 @@
+from django.test import TestCase
+
+import json
+
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from ember_drf.pagination import SideloadCursorPagination
+from ember_drf.renderers import ActiveModelJSONRenderer, EmberJSONRenderer
+
+from tests.models import ChildModel, ParentModel
+from tests.serializers import ChildSideloadSerializer
+
+factory = APIRequestFactory()
+
+
+class Pagination(SideloadCursorPagination):
+    page_size = 2
+
+
+class PaginatedChildView(generics.ListAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = ChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    pagination_class = Pagination
+    filter_backends = ()
+
+
+class EmberPaginatedChildView(PaginatedChildView):
+    renderer_classes = (EmberJSONRenderer,)
+
+
+class SideloadCursorPaginationTests(TestCase):
+
+    def setUp(self):
+        self.parents = [ParentModel.objects.create() for x in range(3)]
+        self.children = [
+            ChildModel.objects.create(parent=parent, old_parent=parent)
+            for parent in self.parents]
+
+    def get(self, params=None, view=PaginatedChildView):
+        response = view.as_view()(factory.get('/', params or {}))
+        response.render()
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_pages(self):
+        data = self.get()
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [c.pk for c in self.children[:2]])
+        self.assertEqual([p['id'] for p in data['parent_models']],
+                         [p.pk for p in self.parents[:2]])
+        self.assertIsNone(data['meta']['previous_cursor'])
+        cursor = data['meta']['next_cursor']
+        self.assertIsNotNone(cursor)
+
+        data = self.get({'cursor': cursor})
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [self.children[2].pk])
+        self.assertEqual([p['id'] for p in data['parent_models']],
+                         [self.parents[2].pk])
+        self.assertIsNone(data['meta']['next_cursor'])
+        self.assertIsNotNone(data['meta']['previous_cursor'])
+
+    def test_no_count_query(self):
+        with self.assertNumQueries(4):
+            self.get()
+
+    def test_ember_meta(self):
+        data = self.get(view=EmberPaginatedChildView)
+        self.assertIn('nextCursor', data['meta'])
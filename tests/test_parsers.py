@@ -1,5 +1,8 @@
+import pytest
+
 from ember_drf.parsers import ActiveModelJSONParser, EmberJSONParser
 from django.utils.six.moves import StringIO
+from rest_framework.exceptions import ParseError
 
 
 def test_active_model_parser():
@@ -15,3 +18,23 @@ def test_ember_json_parser():
     expected = {'child_object': {'parent': 1, 'child_ids': [1, 2, 3],
                 'text_attribute': 'something_id'}}
     assert EmberJSONParser().parse(stream) == expected
+
+def test_parser_converts_nested_lists():
+    stream = StringIO('[{"childObjects": [{"someKey": {"deepKey": 1}}]}]')
+    expected = [{'child_objects': [{'some_key': {'deep_key': 1}}]}]
+    assert EmberJSONParser().parse(stream) == expected
+
+def test_parser_max_body_size():
+    class LimitedParser(ActiveModelJSONParser):
+        max_body_size = 10
+    with pytest.raises(ParseError):
+        LimitedParser().parse(StringIO('{"child": {"parent_id": 1}}'))
+    assert LimitedParser().parse(StringIO('{"id": 1}')) == {'id': 1}
+
+def test_parser_max_depth():
+    class LimitedParser(EmberJSONParser):
+        max_depth = 2
+    with pytest.raises(ParseError):
+        LimitedParser().parse(StringIO('{"a": [{"b": 1}]}'))
+    assert LimitedParser().parse(StringIO('{"a": ["[[{{"]}')) == \
+        {'a': ['[[{{']}
@@ -6,13 +6,22 @@ from rest_framework.compat import OrderedDict
 from rest_framework.renderers import JSONRenderer
 from rest_framework.serializers import ReturnDict
 
-from ember_drf.renderers import EmberJSONRenderer, convert_to_active_model_json
+from ember_drf.renderers import (
+    ActiveModelJSONRenderer, EmberJSONRenderer,
+    convert_to_active_model_json
+)
+from ember_drf.utils import (
+    KeyConversionCache, camelize_key, seed_key_caches, get_ember_key_plan,
+    convert_to_ember_json, get_related_fields_to_rename,
+    rename_related_fields, RelatedFieldRename
+)
 
 from tests.serializers import (
     ChildSideloadSerializer, NestedChildSideloadSerializer,
-    NestedParentSideloadSerializer, DeepNestedParentSideloadSerializer
+    NestedParentSideloadSerializer, DeepNestedParentSideloadSerializer,
+    CategorySideloadSerializer
 )
-from tests.models import ChildModel, ParentModel
+from tests.models import ChildModel, ParentModel, CategoryModel
 
 class RendererTests(TestCase):
 
@@ -34,6 +43,74 @@ class RendererTests(TestCase):
         assert EmberJSONRenderer().render(obj) == \
             JSONRenderer().render(expected)
 
+    def test_key_conversion_cache(self):
+        calls = []
+        def upper(key):
+            calls.append(key)
+            return key.upper()
+        cache = KeyConversionCache(upper, maxsize=2)
+        self.assertEqual(cache('a'), 'A')
+        self.assertEqual(cache('a'), 'A')
+        cache('b')
+        cache('c')
+        self.assertEqual(calls, ['a', 'b', 'c'])
+        self.assertEqual(cache.info(), (1, 3, 2, 2))
+        cache('a')
+        self.assertEqual(calls, ['a', 'b', 'c', 'a'])
+
+    def test_key_conversion_cache_evicts_least_recently_used(self):
+        calls = []
+        def upper(key):
+            calls.append(key)
+            return key.upper()
+        cache = KeyConversionCache(upper, maxsize=2)
+        cache('a')
+        cache('b')
+        cache('a')
+        cache('c')
+        cache('a')
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+    def test_key_conversion_cache_size_setting(self):
+        with self.settings(EMBER_DRF_KEY_CACHE_SIZE=3):
+            self.assertEqual(KeyConversionCache(len).maxsize, 3)
+
+    def test_seed_key_caches(self):
+        camelize_key.clear()
+        seed_key_caches(ChildSideloadSerializer)
+        camelize_key('old_parent')
+        camelize_key('parent_models')
+        self.assertEqual(camelize_key.info().hits, 2)
+        self.assertEqual(camelize_key.info().misses, 0)
+
+    def test_ember_json_renderer_uses_serializer_plan(self):
+        p = ParentModel.objects.create()
+        c = ChildModel.objects.create(parent=p, old_parent=p)
+        data = DeepNestedParentSideloadSerializer(instance=p).data
+        expected = {
+            'parentModel': {
+                'id': p.id, 'text': p.text,
+                'children': [{'id': c.id, 'parent': {
+                    'id': p.id, 'text': p.text, 'children': [c.id],
+                    'oldChildren': [c.id]}, 'oldParent': {
+                    'id': p.id, 'text': p.text, 'children': [c.id],
+                    'oldChildren': [c.id]}}],
+                'oldChildren': [{'id': c.id, 'parent': {
+                    'id': p.id, 'text': p.text, 'children': [c.id],
+                    'oldChildren': [c.id]}, 'oldParent': {
+                    'id': p.id, 'text': p.text, 'children': [c.id],
+                    'oldChildren': [c.id]}}]
+            }
+        }
+        self.assertEqual(convert_to_ember_json(data), expected)
+        plan = get_ember_key_plan(data['parent_model'].serializer)
+        self.assertEqual(plan['old_children'][0], 'oldChildren')
+        self.assertEqual(
+            plan['old_children'][1]['old_parent'][1]['old_children'],
+            ('oldChildren', None))
+        self.assertIs(
+            get_ember_key_plan(data['parent_model'].serializer), plan)
+
     def test_convert_related_keys_single(self):
         parent = ParentModel.objects.create()
         old_parent = ParentModel.objects.create()
@@ -140,3 +217,80 @@ class RendererTests(TestCase):
         }
         result = convert_to_active_model_json(obj)
         assert result == expected
+
+    def test_related_fields_to_rename_are_cached(self):
+        parent = ParentModel.objects.create()
+        child = ChildModel.objects.create(parent=parent, old_parent=parent)
+        first = ChildSideloadSerializer([child], many=True).data
+        second = ChildSideloadSerializer([child], many=True).data
+        renames = get_related_fields_to_rename(
+            first['parent_models'].serializer, ['parent_models'])
+        self.assertIs(renames, get_related_fields_to_rename(
+            second['parent_models'].serializer, ['parent_models']))
+        self.assertEqual(
+            sorted(r.new_name for r in renames),
+            ['child_ids', 'old_child_ids'])
+
+    def test_rename_related_fields_only_renames_matching_paths(self):
+        fields = [
+            RelatedFieldRename(['a', 'parent'], 'parent_id'),
+            RelatedFieldRename(['b', 'children'], 'child_ids'),
+            RelatedFieldRename(['b', 'nested', 'parent'], 'parent_id'),
+        ]
+        data = {
+            'a': [{'parent': 1, 'children': [2]}],
+            'b': {'parent': 1, 'children': [2],
+                  'nested': [{'parent': 3}, {'parent': 4}]},
+            'c': {'parent': 1}
+        }
+        expected = {
+            'a': [{'parent_id': 1, 'children': [2]}],
+            'b': {'parent': 1, 'child_ids': [2],
+                  'nested': [{'parent_id': 3}, {'parent_id': 4}]},
+            'c': {'parent': 1}
+        }
+        self.assertEqual(rename_related_fields(data, fields), expected)
+
+
+class StreamingRendererTests(TestCase):
+
+    def setUp(self):
+        self.parents = [ParentModel.objects.create() for x in range(3)]
+        for x in range(5):
+            ChildModel.objects.create(
+                parent=self.parents[x % 3], old_parent=self.parents[0])
+
+    def assert_stream_matches_render(self, renderer):
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), many=True)
+        streamed = b''.join(renderer.stream(serializer, chunk_size=2))
+        rendered = renderer.render(
+            ChildSideloadSerializer(ChildModel.objects.all(), many=True).data)
+        self.assertEqual(json.loads(streamed.decode('utf-8')),
+                         json.loads(rendered.decode('utf-8')))
+
+    def test_active_model_json_renderer_stream(self):
+        self.assert_stream_matches_render(ActiveModelJSONRenderer())
+
+    def test_ember_json_renderer_stream(self):
+        self.assert_stream_matches_render(EmberJSONRenderer())
+
+    def test_stream_fetches_sideloads_in_chunks(self):
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), many=True)
+        # 1 query for the children, then 3 per chunk of 2 parents (the
+        # parents and their two prefetched relations)
+        with self.assertNumQueries(7):
+            b''.join(ActiveModelJSONRenderer().stream(serializer, 2))
+
+    def test_stream_self_referential_sideloads(self):
+        root = CategoryModel.objects.create()
+        for x in range(3):
+            CategoryModel.objects.create(parent=root)
+        serializer = CategorySideloadSerializer(
+            CategoryModel.objects.filter(parent=root), many=True)
+        data = json.loads(b''.join(EmberJSONRenderer().stream(
+            serializer, 2)).decode('utf-8'))
+        self.assertEqual(len(data['categoryModels']), 3)
+        self.assertEqual([c['id'] for c in data['_categoryModels']],
+                         [root.pk])
@@ -1,16 +1,35 @@
+from io import BytesIO
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ember_drf.serializers import SideloadListSerializer
+from ember_drf import serializers
+from ember_drf.parsers import ActiveModelJSONParser, EmberJSONParser
+from ember_drf.serializers import SideloadListSerializer, \
+    get_eager_loading_lookups, get_only_fields, get_sideload_configuration
 from ember_drf.views import exception_handler
 
+from rest_framework.request import Request
 from rest_framework.serializers import ValidationError
+from rest_framework.test import APIRequestFactory
 
 from tests.models import ChildModel, ParentModel, OptionalChildModel, \
-    OneToOne, ReverseOneToOne
+    OneToOne, ReverseOneToOne, CategoryModel, ActivityModel, CodeModel, \
+    CodeReferenceModel, SlugModel, SlugReferenceModel
 from tests.serializers import ChildSideloadSerializer, \
     OptionalChildSideloadSerializer, OneToOneSideloadSerializer, \
     ReverseOneToOneSideloadSerializer, ChildSerializer, \
-    ParentSideloadSerializer, ParentSideloadSerializerWithContext
+    ParentSideloadSerializer, ParentSideloadSerializerWithContext, \
+    NestedChildWithSideloadsSerializer, EagerNestedChildSideloadSerializer, \
+    NestedChildSerializer, ParentSerializer, \
+    IdentityMapChildSideloadSerializer, CategorySideloadSerializer, \
+    TransitiveCategorySideloadSerializer, ActivitySideloadSerializer, \
+    CodeReferenceSideloadSerializer, RecordingChildSideloadSerializer, \
+    RecordingChildSerializer, TransitiveCategoryParentSideloadSerializer, \
+    WritableParentSideloadSerializer, \
+    WritableChildSideloadSerializer, WritableCategorySideloadSerializer, \
+    SlugReferenceSideloadSerializer
 
 
 class TestSideloadSerializer(TestCase):
@@ -179,6 +198,218 @@ class TestSideloadSerializerUpdate(TestCase):
             ChildModel.objects.get(pk=self.child.pk).old_parent, self.parent)
 
 
+class TestEmbeddedSideloadWrite(TestCase):
+
+    def test_create_with_new_children(self):
+        existing = ParentModel.objects.create()
+        payload = {
+            'parent_model': {'id': 'new-parent', 'text': 'new',
+                             'children': [], 'old_children': []},
+            'child_models': [
+                {'id': 'new-1', 'parent': 'new-parent',
+                 'old_parent': 'new-parent'},
+                {'id': 'new-2', 'parent': 'new-parent',
+                 'old_parent': existing.pk},
+            ]
+        }
+        serializer = WritableParentSideloadSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        parent = serializer.save()
+        self.assertEqual(parent.text, 'new')
+        self.assertEqual(parent.children.count(), 2)
+        self.assertEqual(parent.old_children.count(), 1)
+        self.assertEqual(len(serializer.data['child_models']), 2)
+
+    def test_create_with_new_parent(self):
+        payload = {
+            'child_model': {'parent': 'p', 'old_parent': 'p'},
+            'parent_models': [{'id': 'p', 'text': 'new', 'children': [],
+                               'old_children': []}],
+        }
+        serializer = WritableChildSideloadSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        child = serializer.save()
+        self.assertEqual(child.parent.text, 'new')
+        self.assertEqual(child.parent, child.old_parent)
+        self.assertEqual(ParentModel.objects.count(), 1)
+
+    def test_chain_is_saved_in_order(self):
+        payload = {
+            'category_model': {'id': 'a', 'parent': 'b', 'children': []},
+            'category_models': [{'id': 'b', 'parent': 'c', 'children': []},
+                                {'id': 'c', 'children': []}],
+        }
+        serializer = WritableCategorySideloadSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        category = serializer.save()
+        self.assertIsNone(category.parent.parent.parent)
+        self.assertEqual(CategoryModel.objects.count(), 3)
+
+    def test_cycle(self):
+        payload = {
+            'category_model': {'id': 'a', 'parent': 'b', 'children': []},
+            'category_models': [{'id': 'b', 'parent': 'a', 'children': []}],
+        }
+        serializer = WritableCategorySideloadSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('non_field_errors', serializer.errors)
+
+    def test_invalid_embedded_record(self):
+        payload = {
+            'parent_model': {'id': 'p', 'text': 'new', 'children': [],
+                             'old_children': []},
+            'child_models': [{'parent': 'p', 'old_parent': 'p'},
+                             {'parent': 'p'}],
+        }
+        serializer = WritableParentSideloadSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['child_models'][0], {})
+        self.assertIn('old_parent', serializer.errors['child_models'][1])
+        self.assertEqual(ParentModel.objects.count(), 0)
+
+    def test_requires_opt_in(self):
+        payload = {
+            'child_model': {'parent': 'p', 'old_parent': 'p'},
+            'parent_models': [{'id': 'p', 'text': 'new', 'children': [],
+                               'old_children': []}],
+        }
+        serializer = ChildSideloadSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('parent', serializer.errors)
+        self.assertEqual(ParentModel.objects.count(), 0)
+
+    def test_echoed_payload_creates_nothing(self):
+        parent = ParentModel.objects.create(text='old')
+        child = ChildModel.objects.create(parent=parent, old_parent=parent)
+        data = WritableChildSideloadSerializer(child).data
+        serializer = WritableChildSideloadSerializer(child, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(ParentModel.objects.count(), 1)
+        self.assertEqual(ChildModel.objects.get(pk=child.pk).parent, parent)
+
+    def test_existing_records_are_untouched(self):
+        parent = ParentModel.objects.create(text='old')
+        payload = {
+            'child_model': {'parent': parent.pk, 'old_parent': parent.pk},
+            'parent_models': [{'id': parent.pk, 'text': 'changed',
+                               'children': [], 'old_children': []}],
+        }
+        serializer = WritableChildSideloadSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        child = serializer.save()
+        self.assertEqual(child.parent, parent)
+        self.assertEqual(ParentModel.objects.get().text, 'old')
+
+    def test_client_id(self):
+        existing = ParentModel.objects.create()
+        payload = {
+            'child_model': {'parent': str(existing.pk),
+                            'old_parent': str(existing.pk)},
+            'parent_models': [{'client_id': str(existing.pk), 'text': 'new',
+                               'children': [], 'old_children': []}],
+        }
+        serializer = WritableChildSideloadSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        child = serializer.save()
+        self.assertEqual(child.parent.text, 'new')
+        self.assertNotEqual(child.parent, existing)
+
+    def test_client_id_through_parsers(self):
+        payloads = [
+            (ActiveModelJSONParser(),
+             b'{"child_model": {"parent_id": "p", "old_parent_id": "p"}, '
+             b'"parent_models": [{"client_id": "p", "text": "new", '
+             b'"child_ids": [], "old_child_ids": []}]}'),
+            (EmberJSONParser(),
+             b'{"childModel": {"parent": "p", "oldParent": "p"}, '
+             b'"parentModels": [{"clientId": "p", "text": "new", '
+             b'"children": [], "oldChildren": []}]}'),
+        ]
+        for parser, body in payloads:
+            data = parser.parse(BytesIO(body))
+            serializer = WritableChildSideloadSerializer(data=data)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            child = serializer.save()
+            self.assertEqual(child.parent.text, 'new')
+
+    def test_integer_client_id(self):
+        payload = {
+            'child_model': {'parent': 1, 'old_parent': 1},
+            'parent_models': [{'client_id': 1, 'text': 'new',
+                               'children': [], 'old_children': []}],
+        }
+        serializer = WritableChildSideloadSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('parent_models', serializer.errors)
+        self.assertEqual(ParentModel.objects.count(), 0)
+
+
+class TestSideloadListSerializerWrite(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+        self.old_parent = ParentModel.objects.create()
+
+    def test_requires_plural_root_key(self):
+        with self.assertRaises(AssertionError):
+            ChildSideloadSerializer(data={'child_model': {}}, many=True)
+
+    def test_create(self):
+        payload = {'child_models': [
+            {'parent': self.parent.pk, 'old_parent': self.old_parent.pk}
+            for x in range(3)]}
+        serializer = ChildSideloadSerializer(data=payload, many=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(ChildModel.objects.count(), 3)
+        self.assertEqual(len(serializer.data['child_models']), 3)
+        self.assertEqual(len(serializer.data['parent_models']), 2)
+
+    def test_create_validates_all_items(self):
+        payload = {'child_models': [
+            {'parent': self.parent.pk, 'old_parent': self.old_parent.pk},
+            {'parent': self.parent.pk}]}
+        serializer = ChildSideloadSerializer(data=payload, many=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {})
+        self.assertIn('old_parent', serializer.errors[1])
+
+    def test_update(self):
+        children = [ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent) for x in range(2)]
+        payload = {'child_models': [
+            {'id': child.pk, 'old_parent': self.old_parent.pk}
+            for child in children]}
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), data=payload, many=True, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(
+            ChildModel.objects.filter(old_parent=self.old_parent).count(), 2)
+        self.assertEqual([c['id'] for c in serializer.data['child_models']],
+                         [c.pk for c in children])
+
+    def test_update_uses_overridden_update(self):
+        child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+        payload = {'child_models': [
+            {'id': child.pk, 'old_parent': self.old_parent.pk}]}
+        RecordingChildSerializer.updated = []
+        serializer = RecordingChildSideloadSerializer(
+            ChildModel.objects.all(), data=payload, many=True, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(RecordingChildSerializer.updated, [child.pk])
+
+    def test_update_unknown_id(self):
+        payload = {'child_models': [{'id': 1000, 'parent': self.parent.pk}]}
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), data=payload, many=True, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {'id': ['Record not found.']})
+
+
 class TestSideloadListSerializer(TestCase):
 
     def setUp(self):
@@ -198,6 +429,35 @@ class TestSideloadListSerializer(TestCase):
         self.assertEqual(result['parent_models'],
                          set([p.id for p in self.parents]))
 
+    def test_get_sideload_ids_does_not_load_foreign_keys(self):
+        serializer = NestedChildWithSideloadsSerializer(many=True)
+        with self.assertNumQueries(1):
+            result = serializer.get_sideload_ids(ChildModel.objects.all())
+        self.assertEqual(result['parent_models'],
+                         set([p.id for p in self.parents]))
+        ChildModel.objects.bulk_create([
+            ChildModel(parent=self.parents[0], old_parent=self.parents[1])
+            for x in range(10)])
+        with self.assertNumQueries(1):
+            serializer.get_sideload_ids(ChildModel.objects.all())
+
+    def test_get_many_sideload_ids(self):
+        # one query for the parents and one per reverse relation
+        with self.assertNumQueries(3):
+            result = ParentSideloadSerializer(many=True).get_sideload_ids(
+                ParentModel.objects.all())
+        self.assertEqual(result['child_models'],
+                         set([c.id for c in self.children]))
+
+    def test_get_reverse_one_to_one_sideload_ids(self):
+        reverse = [ReverseOneToOne.objects.create() for x in range(3)]
+        ones = [OneToOne.objects.create(reverse_one_to_one=r)
+                for r in reverse[:2]]
+        with self.assertNumQueries(2):
+            result = ReverseOneToOneSideloadSerializer(
+                many=True).get_sideload_ids(ReverseOneToOne.objects.all())
+        self.assertEqual(result['one_to_ones'], set([o.id for o in ones]))
+
     def test_get_sideload_objects(self):
         with self.assertNumQueries(4):
             result = ChildSideloadSerializer(many=True).get_sideload_objects(
@@ -230,6 +490,392 @@ class TestSideloadListSerializer(TestCase):
         self.assertEqual(result, expected)
 
 
+class TestEagerLoading(TestCase):
+
+    def create_children(self, count):
+        parents = [ParentModel.objects.create() for x in range(3)]
+        ChildModel.objects.bulk_create([
+            ChildModel(parent=parents[x % 3], old_parent=parents[0])
+            for x in range(count)])
+
+    def count_queries(self, serializer_class):
+        with CaptureQueriesContext(connection) as queries:
+            data = serializer_class(ChildModel.objects.all(), many=True).data
+        return len(queries), data
+
+    def test_lookups(self):
+        select, prefetch = get_eager_loading_lookups(
+            NestedChildSerializer(), ChildModel)
+        self.assertEqual(sorted(select), ['old_parent', 'parent'])
+        self.assertEqual(sorted(prefetch), [
+            'old_parent__children', 'old_parent__old_children',
+            'parent__children', 'parent__old_children'])
+        self.assertEqual(
+            get_eager_loading_lookups(ParentSerializer(), ParentModel),
+            ([], ['children', 'old_children']))
+
+    def test_only_fields(self):
+        self.assertEqual(get_only_fields(ParentSerializer(), ParentModel),
+                         ['id', 'text'])
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.create_children(3)
+        few, eager_data = self.count_queries(
+            EagerNestedChildSideloadSerializer)
+        self.create_children(10)
+        many, _ = self.count_queries(EagerNestedChildSideloadSerializer)
+        self.assertEqual(few, many)
+
+    def test_eager_loading_output_is_unchanged(self):
+        self.create_children(4)
+        _, eager_data = self.count_queries(EagerNestedChildSideloadSerializer)
+        _, data = self.count_queries(NestedChildWithSideloadsSerializer)
+        self.assertEqual(eager_data, data)
+
+
+class TestSparseFieldsets(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create(text='parent')
+        self.child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+
+    def get_context(self, params):
+        return {'request': Request(APIRequestFactory().get('/', params))}
+
+    def test_list(self):
+        context = self.get_context({
+            'fields[child_models]': 'parent',
+            'fields[parent_models]': 'text',
+        })
+        data = ChildSideloadSerializer(
+            ChildModel.objects.all(), many=True, context=context).data
+        self.assertEqual(data['child_models'],
+                         [{'id': self.child.pk, 'parent': self.parent.pk}])
+        self.assertEqual(data['parent_models'],
+                         [{'id': self.parent.pk, 'text': 'parent'}])
+
+    def test_plan_caches_are_bounded(self):
+        plans = serializers._eager_loading_plans
+        maxsize = plans.maxsize
+        plans.resize(2)
+        try:
+            for fields in ['text', 'children', 'old_children',
+                           'text,children']:
+                ParentSideloadSerializer(
+                    ParentModel.objects.all(), many=True,
+                    context=self.get_context(
+                        {'fields[parent_models]': fields})).data
+            self.assertEqual(plans.info().currsize, 2)
+        finally:
+            plans.resize(maxsize)
+
+    def test_only_requested_columns_are_selected(self):
+        context = self.get_context({'fields[parent_models]': 'children'})
+        with CaptureQueriesContext(connection) as queries:
+            data = ParentSideloadSerializer(
+                ParentModel.objects.all(), many=True, context=context).data
+        self.assertEqual(list(data['parent_models'][0]), ['id', 'children'])
+        self.assertNotIn('text', queries[0]['sql'])
+
+    def test_detail(self):
+        context = self.get_context({'fields[child_models]': 'old_parent'})
+        data = ChildSideloadSerializer(self.child, context=context).data
+        self.assertEqual(data['child_model'],
+                         {'id': self.child.pk, 'old_parent': self.parent.pk})
+        self.assertEqual(len(data['parent_models']), 1)
+
+    def test_camelized_names(self):
+        context = self.get_context({'fields[childModels]': 'oldParent'})
+        data = ChildSideloadSerializer(self.child, context=context).data
+        self.assertEqual(data['child_model'],
+                         {'id': self.child.pk, 'old_parent': self.parent.pk})
+
+    def test_unknown_field(self):
+        context = self.get_context({'fields[child_models]': 'nope'})
+        with self.assertRaises(ValidationError):
+            ChildSideloadSerializer(
+                ChildModel.objects.all(), many=True, context=context).data
+
+
+class TestIncludedSideloads(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+        self.child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+
+    def serialize(self, params, serializer_class=ParentSideloadSerializer):
+        context = {'request': Request(APIRequestFactory().get('/', params))}
+        return serializer_class(
+            ParentModel.objects.all(), many=True, context=context).data
+
+    def test_include(self):
+        data = self.serialize({'include': 'child_models'})
+        self.assertEqual(sorted(data), ['child_models', 'parent_models'])
+
+    def test_include_none(self):
+        # the parent query and the reverse relations of ParentSerializer
+        with self.assertNumQueries(3):
+            data = self.serialize({'include': ''})
+        self.assertEqual(list(data), ['parent_models'])
+
+    def test_exclude(self):
+        with self.assertNumQueries(3):
+            data = self.serialize({'exclude': 'child_models'})
+        self.assertEqual(list(data), ['parent_models'])
+
+    def test_camelized_names(self):
+        data = self.serialize({'include': 'childModels'})
+        self.assertEqual(sorted(data), ['child_models', 'parent_models'])
+        data = self.serialize({'exclude': 'childModels'})
+        self.assertEqual(list(data), ['parent_models'])
+
+    def test_unknown_sideload(self):
+        with self.assertRaises(ValidationError):
+            self.serialize({'include': 'nope'})
+
+
+class TestSideloadConfiguration(TestCase):
+
+    def test_configuration_is_shared(self):
+        config = get_sideload_configuration(ChildSideloadSerializer)
+        self.assertIs(get_sideload_configuration(ChildSideloadSerializer),
+                      config)
+        self.assertIs(ChildSideloadSerializer().sideloads, config.sideloads)
+        self.assertIs(
+            ChildSideloadSerializer(many=True).sideloads, config.sideloads)
+        self.assertEqual(sorted(config.sideloads_by_key), ['parent_models'])
+
+    def test_list_serializer_creates_base_serializer_lazily(self):
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), many=True)
+        self.assertNotIn('_base_serializer', vars(serializer))
+        serializer.data
+        self.assertNotIn('_base_serializer', vars(serializer))
+        self.assertIsInstance(serializer.base_serializer, ChildSerializer)
+
+    def test_list_child_has_no_base_serializer(self):
+        serializer = ChildSideloadSerializer(
+            ChildModel.objects.all(), many=True)
+        serializer.data
+        attrs = vars(serializer.child)
+        self.assertNotIn('base_serializer', attrs)
+        self.assertNotIn('_base_serializer', attrs)
+
+
+class TestIdentityMap(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+        self.old_parent = ParentModel.objects.create()
+        self.children = [
+            ChildModel.objects.create(
+                parent=self.parent, old_parent=self.old_parent)
+            for x in range(3)]
+
+    def test_sideloads_are_serialized_once_per_context(self):
+        context = {}
+        first = ChildSideloadSerializer(self.children[0], context=context)
+        first.data
+        second = ChildSideloadSerializer(self.children[1], context=context)
+        with self.assertNumQueries(0):
+            result = second.get_sideload_objects(self.children[1])
+        self.assertEqual(sorted(p['id'] for p in result['parent_models']),
+                         [self.parent.pk, self.old_parent.pk])
+
+    def test_nested_records_are_reused_for_sideloads(self):
+        serializer = IdentityMapChildSideloadSerializer(
+            ChildModel.objects.all(), many=True)
+        data = serializer.data
+        nested = data['child_models'][0]['parent']
+        self.assertIs(data['child_models'][1]['parent'], nested)
+        self.assertEqual(len(data['parent_models']), 2)
+        self.assertTrue(any(p is nested for p in data['parent_models']))
+
+    def test_save_clears_the_map(self):
+        context = {}
+        ChildSideloadSerializer(self.children[0], context=context).data
+        serializer = ChildSideloadSerializer(
+            self.children[1], context=context, data={'child_model': {
+                'id': self.children[1].pk, 'parent': self.old_parent.pk,
+                'old_parent': self.old_parent.pk}})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        data = ChildSideloadSerializer(self.children[0], context=context).data
+        parent = [p for p in data['parent_models']
+                  if p['id'] == self.parent.pk][0]
+        self.assertEqual(sorted(parent['children']),
+                         [self.children[0].pk, self.children[2].pk])
+
+    def test_records_from_the_map_keep_pk_order(self):
+        context = {}
+        parents = [self.parent, self.old_parent, ParentModel.objects.create()]
+        # only the first parent is in the map
+        ChildSideloadSerializer(ChildModel.objects.create(
+            parent=parents[0], old_parent=parents[0]), context=context).data
+        child = ChildModel.objects.create(
+            parent=parents[1], old_parent=parents[2])
+        data = ChildSideloadSerializer(
+            ChildModel.objects.filter(pk__in=[self.children[0].pk, child.pk]),
+            many=True, context=context).data
+        self.assertEqual([p['id'] for p in data['parent_models']],
+                         sorted(p.pk for p in parents))
+
+
+class TestSelfReferentialSideloads(TestCase):
+
+    def setUp(self):
+        self.root = CategoryModel.objects.create()
+        self.a = CategoryModel.objects.create(parent=self.root)
+        self.b = CategoryModel.objects.create(parent=self.root)
+        self.grandchild = CategoryModel.objects.create(parent=self.a)
+
+    def test_primary_records_are_not_sideloaded(self):
+        result = CategorySideloadSerializer(self.a).data
+        self.assertEqual(result['category_model']['id'], self.a.pk)
+        self.assertEqual(
+            sorted(c['id'] for c in result['category_models']),
+            [self.root.pk, self.grandchild.pk])
+
+    def test_list_sideloads_use_underscore_key(self):
+        result = CategorySideloadSerializer(
+            CategoryModel.objects.filter(parent=self.root), many=True).data
+        self.assertEqual([c['id'] for c in result['category_models']],
+                         [self.a.pk, self.b.pk])
+        self.assertEqual(
+            sorted(c['id'] for c in result['_category_models']),
+            [self.root.pk, self.grandchild.pk])
+
+    def test_sideload_ids_excludes_loaded_records(self):
+        serializer = CategorySideloadSerializer(many=True)
+        ids = serializer.exclude_loaded_ids(
+            {'category_models': set([self.root.pk, self.a.pk])},
+            [self.a.pk, self.b.pk])
+        self.assertEqual(ids, {'category_models': set([self.root.pk])})
+
+
+class TestTransitiveSideloads(TestCase):
+
+    def create_chain(self, length):
+        categories = [CategoryModel.objects.create()]
+        for x in range(length - 1):
+            categories.append(
+                CategoryModel.objects.create(parent=categories[-1]))
+        return categories
+
+    def test_depth_one(self):
+        categories = self.create_chain(4)
+        data = CategorySideloadSerializer(categories[3]).data
+        self.assertEqual([c['id'] for c in data['category_models']],
+                         [categories[2].pk])
+
+    def test_depth_two(self):
+        categories = self.create_chain(4)
+        data = TransitiveCategorySideloadSerializer(categories[3]).data
+        self.assertEqual(sorted(c['id'] for c in data['category_models']),
+                         [categories[1].pk, categories[2].pk])
+
+    def test_queries_per_level_do_not_depend_on_rows(self):
+        def serialize():
+            queryset = CategoryModel.objects.filter(
+                parent__parent__isnull=False)
+            TransitiveCategoryParentSideloadSerializer(
+                queryset, many=True).data
+
+        for x in range(2):
+            self.create_chain(3)
+        with CaptureQueriesContext(connection) as queries:
+            serialize()
+        for x in range(3):
+            self.create_chain(3)
+        # the primary records and one query for each of the two levels
+        self.assertEqual(len(queries), 3)
+        with self.assertNumQueries(len(queries)):
+            serialize()
+
+
+class TestToFieldSideloads(TestCase):
+
+    def test_sideloads_records_referenced_by_to_field(self):
+        # give the codes pks that differ from their position
+        CodeModel.objects.create(code='x')
+        codes = [CodeModel.objects.create(code=str(x)) for x in range(2)]
+        reference = CodeReferenceModel.objects.create(code=codes[0])
+        data = CodeReferenceSideloadSerializer(reference).data
+        self.assertEqual([c['id'] for c in data['code_models']],
+                         [codes[0].pk])
+
+    def test_many(self):
+        codes = [CodeModel.objects.create(code=str(x)) for x in range(3)]
+        for code in codes[1:]:
+            CodeReferenceModel.objects.create(code=code)
+        data = CodeReferenceSideloadSerializer(
+            CodeReferenceModel.objects.all(), many=True).data
+        self.assertEqual(sorted(c['id'] for c in data['code_models']),
+                         [c.pk for c in codes[1:]])
+
+
+class TestNonIdPrimaryKeySideloads(TestCase):
+
+    def test_sideloads_records_by_pk(self):
+        slugs = [SlugModel.objects.create(slug=x) for x in 'ab']
+        SlugReferenceModel.objects.create(slug=slugs[0])
+        data = SlugReferenceSideloadSerializer(
+            SlugReferenceModel.objects.all(), many=True).data
+        self.assertEqual([s['slug'] for s in data['slug_models']], ['a'])
+
+
+class TestGenericRelationSideloads(TestCase):
+
+    def setUp(self):
+        self.parents = [ParentModel.objects.create() for x in range(2)]
+        self.child = ChildModel.objects.create(
+            parent=self.parents[0], old_parent=self.parents[1])
+        self.activities = [
+            ActivityModel.objects.create(subject=subject)
+            for subject in self.parents + [self.child, self.parents[0]]]
+
+    def test_sideloads_grouped_by_content_type(self):
+        data = ActivitySideloadSerializer(
+            ActivityModel.objects.all(), many=True).data
+        self.assertEqual(len(data['activity_models']), 4)
+        self.assertEqual(sorted(p['id'] for p in data['parent_models']),
+                         [p.pk for p in self.parents])
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [self.child.pk])
+
+    def test_single_record(self):
+        data = ActivitySideloadSerializer(self.activities[2]).data
+        self.assertEqual(data['parent_models'], [])
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [self.child.pk])
+
+    def test_one_query_per_content_type(self):
+        with CaptureQueriesContext(connection) as queries:
+            ActivitySideloadSerializer(
+                ActivityModel.objects.all(), many=True).data
+        sideload_queries = [q for q in queries if ' IN (' in q['sql']]
+        self.assertEqual(len(sideload_queries), 2)
+
+    def test_fingerprint_follows_subject(self):
+        queryset = ActivityModel.objects.filter(pk=self.activities[0].pk)
+        serializer = ActivitySideloadSerializer(queryset, many=True)
+        before = serializer.get_fingerprint(queryset)
+        self.activities[0].subject = self.child
+        self.activities[0].save()
+        self.assertNotEqual(before, serializer.get_fingerprint(queryset))
+
+    def test_streaming(self):
+        serializer = ActivitySideloadSerializer(
+            ActivityModel.objects.all(), many=True)
+        sections = dict([(key, [row['id'] for row in rows]) for key, _, rows
+                         in serializer.iter_sections(serializer.instance)])
+        self.assertEqual(sorted(sections['parent_models']),
+                         [p.pk for p in self.parents])
+        self.assertEqual(sections['child_models'], [self.child.pk])
+
+
 class TestChildrenCanAccessParentContext(TestCase):
 
     def test_children_can_access_parent_context(self):
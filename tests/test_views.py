@@ -1,12 +1,27 @@
 from django.test import TestCase
 
-from rest_framework import status
+import json
+
+from rest_framework import generics, status
 from rest_framework.exceptions import ValidationError, APIException
 from rest_framework.settings import api_settings
 from rest_framework.test import APIRequestFactory
 from rest_framework.views import APIView
 
-from ember_drf.views import exception_handler
+from ember_drf.renderers import ActiveModelJSONRenderer
+from ember_drf import compat
+from ember_drf.cache import get_model_versions
+from ember_drf.pagination import SideloadCursorPagination
+from ember_drf.views import (
+    BatchView, BulkWriteMixin, CachedResponseMixin, ConditionalGetMixin,
+    exception_handler, StreamingListMixin
+)
+
+from tests.models import ChildModel, ParentModel
+from tests.serializers import (
+    ChildSideloadSerializer, NestedChildSideloadSerializer,
+    ParentSideloadSerializer
+)
 
 factory = APIRequestFactory()
 
@@ -21,6 +36,14 @@ class ErrorView(APIView):
         raise APIException('invalid data')
 
 
+class StreamingChildView(StreamingListMixin, generics.ListAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = ChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    filter_backends = ()
+    stream_chunk_size = 2
+
+
 class ExceptionHandlerTests(TestCase):
 
     def setUp(self):
@@ -42,3 +65,352 @@ class ExceptionHandlerTests(TestCase):
         self.assertEqual(response.status_code,
                          status.HTTP_500_INTERNAL_SERVER_ERROR)
         self.assertEqual(response.data, {'detail': 'invalid data'})
+
+
+class StreamingListMixinTests(TestCase):
+
+    def test_streaming_list(self):
+        parent = ParentModel.objects.create()
+        children = [ChildModel.objects.create(parent=parent, old_parent=parent)
+                    for x in range(3)]
+        response = StreamingChildView.as_view()(factory.get('/'))
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [c.pk for c in children])
+        self.assertEqual(data['parent_models'][0]['child_ids'],
+                         [c.pk for c in children])
+
+    def test_invalid_query_params(self):
+        view = StreamingChildView.as_view()
+        for params in [{'fields[child_models]': 'nope'},
+                       {'fields[parent_models]': 'nope'},
+                       {'include': 'nope'}]:
+            response = view(factory.get('/', params))
+            self.assertFalse(response.streaming)
+            self.assertEqual(response.status_code, 422)
+
+
+class CachedChildView(CachedResponseMixin, generics.RetrieveAPIView,
+                      generics.ListAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = ChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    filter_backends = ()
+
+    def get(self, request, *args, **kwargs):
+        if 'pk' in kwargs:
+            return self.retrieve(request, *args, **kwargs)
+        return self.list(request, *args, **kwargs)
+
+
+class CachedResponseMixinTests(TestCase):
+
+    def setUp(self):
+        compat.get_cache('default').clear()
+        self.parent = ParentModel.objects.create()
+        self.child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+
+    def get(self, path='/', **kwargs):
+        response = CachedChildView.as_view()(factory.get(path), **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_list_is_cached(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_retrieve_is_cached(self):
+        first = self.get(pk=self.child.pk)
+        with self.assertNumQueries(0):
+            second = self.get(pk=self.child.pk)
+        self.assertEqual(first.content, second.content)
+
+    def test_query_params_vary_key(self):
+        self.get('/?a=1&b=2')
+        with self.assertNumQueries(0):
+            self.get('/?b=2&a=1')
+        with self.assertNumQueries(4):
+            self.get('/?a=2')
+
+    def test_saving_sideloaded_model_invalidates(self):
+        self.get()
+        self.parent.text = 'changed'
+        self.parent.save()
+        response = self.get()
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['parent_models'][0]['text'], 'changed')
+
+    def test_versions_are_bumped_without_serving_the_view(self):
+        # as in a process that never served the view
+        cache = compat.get_cache('default')
+        version = get_model_versions([ParentModel], cache)
+        self.parent.save()
+        self.assertNotEqual(get_model_versions([ParentModel], cache), version)
+
+    def test_hit_restores_headers(self):
+        view = CachedConditionalChildView.as_view()
+        first = view(factory.get('/'))
+        first.render()
+        with self.assertNumQueries(0):
+            second = view(factory.get('/'))
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_hit_answers_if_none_match(self):
+        view = CachedConditionalChildView.as_view()
+        etag = view(factory.get('/')).render()['ETag']
+        with self.assertNumQueries(0):
+            response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_saving_nested_model_invalidates(self):
+        view = CachedNestedChildView.as_view()
+        view(factory.get('/')).render()
+        self.parent.text = 'changed'
+        self.parent.save()
+        response = view(factory.get('/')).render()
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['child_models'][0]['parent']['text'],
+                         'changed')
+
+
+class CachedNestedChildView(CachedResponseMixin, generics.ListAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = NestedChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    filter_backends = ()
+
+
+class ConditionalChildView(ConditionalGetMixin, generics.RetrieveAPIView,
+                           generics.ListAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = ChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    filter_backends = ()
+    etag_fields = ('text',)
+
+    def get(self, request, *args, **kwargs):
+        if 'pk' in kwargs:
+            return self.retrieve(request, *args, **kwargs)
+        return self.list(request, *args, **kwargs)
+
+
+class CachedConditionalChildView(CachedResponseMixin, ConditionalChildView):
+    pass
+
+
+class ConditionalGetMixinTests(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+        self.child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+
+    def get(self, etag=None, **kwargs):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return ConditionalChildView.as_view()(
+            factory.get('/', **headers), **kwargs)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_detail(self):
+        etag = self.get(pk=self.child.pk)['ETag']
+        self.assertEqual(self.get(etag, pk=self.child.pk).status_code, 304)
+
+    def test_changed_sideload_ids(self):
+        etag = self.get()['ETag']
+        ChildModel.objects.create(parent=self.parent, old_parent=self.parent)
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_changed_etag_field(self):
+        etag = self.get()['ETag']
+        self.parent.text = 'changed'
+        self.parent.save()
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_any_etag_for_missing_object(self):
+        self.assertEqual(self.get('*', pk=self.child.pk).status_code, 304)
+        self.assertEqual(self.get('*', pk=self.child.pk + 1).status_code, 404)
+
+    def test_new_next_page_modifies_the_page(self):
+        view = PaginatedConditionalChildView.as_view()
+        response = view(factory.get('/'))
+        response.render()
+        self.assertIn(b'"next_cursor":null', response.content)
+        # a record on a new next page, the records of the page are the same
+        parent = ParentModel.objects.create()
+        ChildModel.objects.create(parent=parent, old_parent=parent)
+        etag = response['ETag']
+        response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        response.render()
+        self.assertNotIn(b'"next_cursor":null', response.content)
+
+    def test_only_the_page_is_fingerprinted(self):
+        view = PaginatedConditionalChildView.as_view()
+        parent = ParentModel.objects.create()
+        ChildModel.objects.create(parent=parent, old_parent=parent)
+        etag = view(factory.get('/'))['ETag']
+        # a record after the next page, that does not change the first one
+        parent = ParentModel.objects.create()
+        ChildModel.objects.create(parent=parent, old_parent=parent)
+        response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+
+class PaginatedConditionalChildView(ConditionalChildView):
+    pagination_class = type('Pagination', (SideloadCursorPagination,),
+                            {'page_size': 1})
+
+
+class ChildParentBatchView(BatchView):
+    renderer_classes = (ActiveModelJSONRenderer,)
+    serializer_classes = (ChildSideloadSerializer, ParentSideloadSerializer)
+    querysets = {ChildSideloadSerializer: ChildModel.objects.all(),
+                 ParentSideloadSerializer: ParentModel.objects.all()}
+
+
+class ScopedBatchView(ChildParentBatchView):
+    def get_queryset(self, serializer_class):
+        queryset = super(ScopedBatchView, self).get_queryset(
+            serializer_class)
+        if serializer_class is ChildSideloadSerializer:
+            queryset = queryset.filter(parent=ParentModel.objects.first())
+        return queryset
+
+
+class BatchViewTests(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+        self.children = [
+            ChildModel.objects.create(parent=self.parent,
+                                      old_parent=self.parent)
+            for x in range(2)]
+
+    def get(self, params, view_class=ChildParentBatchView):
+        response = view_class.as_view()(factory.get('/', params))
+        response.render()
+        return response
+
+    def test_batch(self):
+        response = self.get({
+            'child_models[]': [self.children[0].pk],
+            'parent_models[]': [self.parent.pk],
+        })
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(sorted(data), ['child_models', 'parent_models'])
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [c.pk for c in self.children])
+        self.assertEqual([p['id'] for p in data['parent_models']],
+                         [self.parent.pk])
+
+    def test_single_type(self):
+        response = self.get({'child_models[]': [self.children[1].pk]})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [self.children[1].pk])
+        self.assertEqual(len(data['parent_models']), 1)
+
+    def test_invalid_id(self):
+        api_settings.EXCEPTION_HANDLER = exception_handler
+        response = self.get({'child_models[]': ['abc']})
+        self.assertEqual(response.status_code, 422)
+
+    def test_include_keys_of_another_type(self):
+        response = self.get({
+            'child_models[]': [self.children[0].pk],
+            'parent_models[]': [self.parent.pk],
+            'include': 'parent_models',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(sorted(data), ['child_models', 'parent_models'])
+
+    def test_camelized_include(self):
+        response = self.get({'child_models[]': [self.children[0].pk],
+                             'include': 'parentModels'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(sorted(data), ['child_models', 'parent_models'])
+
+    def test_unknown_include(self):
+        api_settings.EXCEPTION_HANDLER = exception_handler
+        response = self.get({'child_models[]': [self.children[0].pk],
+                             'include': 'unknown_models'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_no_types(self):
+        response = self.get({})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {})
+
+    def test_scoped_queryset(self):
+        other_parent = ParentModel.objects.create()
+        other_child = ChildModel.objects.create(parent=other_parent,
+                                                old_parent=other_parent)
+        response = self.get({
+            'child_models[]': [self.children[0].pk, other_child.pk],
+        }, ScopedBatchView)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([c['id'] for c in data['child_models']],
+                         [self.children[0].pk])
+
+    def test_requires_querysets(self):
+        view_class = type('View', (BatchView,), {
+            'serializer_classes': (ChildSideloadSerializer,)})
+        with self.assertRaises(AssertionError):
+            self.get({'child_models[]': [self.children[0].pk]}, view_class)
+
+
+class BulkChildView(BulkWriteMixin, generics.ListCreateAPIView):
+    queryset = ChildModel.objects.all()
+    serializer_class = ChildSideloadSerializer
+    renderer_classes = (ActiveModelJSONRenderer,)
+    filter_backends = ()
+
+
+class BulkWriteMixinTests(TestCase):
+
+    def setUp(self):
+        self.parent = ParentModel.objects.create()
+
+    def test_bulk_create(self):
+        payload = {'child_models': [
+            {'parent': self.parent.pk, 'old_parent': self.parent.pk}
+            for x in range(3)]}
+        response = BulkChildView.as_view()(
+            factory.post('/', payload, format='json'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChildModel.objects.count(), 3)
+        self.assertEqual(len(response.data['child_models']), 3)
+
+    def test_single_create(self):
+        payload = {'child_model': {
+            'parent': self.parent.pk, 'old_parent': self.parent.pk}}
+        response = BulkChildView.as_view()(
+            factory.post('/', payload, format='json'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChildModel.objects.count(), 1)
+
+    def test_bulk_partial_update(self):
+        other = ParentModel.objects.create()
+        child = ChildModel.objects.create(
+            parent=self.parent, old_parent=self.parent)
+        payload = {'child_models': [{'id': child.pk, 'parent': other.pk}]}
+        response = BulkChildView.as_view()(
+            factory.patch('/', payload, format='json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ChildModel.objects.get(pk=child.pk).parent, other)
+